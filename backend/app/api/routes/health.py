@@ -1,4 +1,8 @@
+import time
+import asyncio
 from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
 from datetime import datetime
 
 from app.core.config import settings
@@ -6,40 +10,78 @@ from app.core.cache import get_redis
 
 router = APIRouter()
 
+_HAS_GEMINI = bool(settings.GEMINI_API_KEY)
+_HEALTH_TTL_SECONDS = 1.0
+_PING_TIMEOUT_SECONDS = 0.5
+_PING_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+_health_cache = {"ts": 0.0, "payload": None}
+_health_lock = asyncio.Lock()
+_ready_cache = {"ts": 0.0, "response": None}
+
 
 @router.get("/", status_code=status.HTTP_200_OK)
 async def health_check():
-    redis_healthy = False
-    redis_client = await get_redis()
+    # Load balancers probe frequently; serve a payload that is at most one second old
+    if _health_cache["payload"] and time.monotonic() - _health_cache["ts"] < _HEALTH_TTL_SECONDS:
+        return _health_cache["payload"]
     
-    if redis_client:
-        try:
-            await redis_client.ping()
-            redis_healthy = True
-        except:
-            pass
-    
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": settings.VERSION,
-        "services": {
-            "redis": redis_healthy,
-            "gemini": bool(settings.GEMINI_API_KEY),
+    async with _health_lock:
+        if _health_cache["payload"] and time.monotonic() - _health_cache["ts"] < _HEALTH_TTL_SECONDS:
+            return _health_cache["payload"]
+        
+        redis_healthy = False
+        redis_client = await get_redis()
+        
+        if redis_client:
+            try:
+                await asyncio.wait_for(redis_client.ping(), timeout=_PING_TIMEOUT_SECONDS)
+                redis_healthy = True
+            except _PING_ERRORS:
+                pass
+        
+        payload = {
+            "status": "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "version": settings.VERSION,
+            "services": {
+                "redis": redis_healthy,
+                "gemini": _HAS_GEMINI,
+            }
         }
-    }
+        _health_cache["ts"] = time.monotonic()
+        _health_cache["payload"] = payload
+        
+        return payload
 
 
 @router.get("/ready", status_code=status.HTTP_200_OK)
 async def readiness_check():
+    # Probes hit this often; reuse the last verdict for up to a second
+    if _ready_cache["response"] and time.monotonic() - _ready_cache["ts"] < _HEALTH_TTL_SECONDS:
+        return _ready_cache["response"]
+    
+    response = await _check_readiness()
+    _ready_cache["ts"] = time.monotonic()
+    _ready_cache["response"] = response
+    
+    return response
+
+
+async def _check_readiness() -> ORJSONResponse:
     redis_client = await get_redis()
     
     if not redis_client:
-        return {"status": "not_ready", "reason": "Redis not connected"}, status.HTTP_503_SERVICE_UNAVAILABLE
+        return ORJSONResponse(
+            {"status": "not_ready", "reason": "Redis not connected"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     
     try:
-        await redis_client.ping()
-    except:
-        return {"status": "not_ready", "reason": "Redis ping failed"}, status.HTTP_503_SERVICE_UNAVAILABLE
+        await asyncio.wait_for(redis_client.ping(), timeout=_PING_TIMEOUT_SECONDS)
+    except _PING_ERRORS:
+        return ORJSONResponse(
+            {"status": "not_ready", "reason": "Redis ping failed"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     
-    return {"status": "ready"}
\ No newline at end of file
+    return ORJSONResponse({"status": "ready"})
\ No newline at end of file
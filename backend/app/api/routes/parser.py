@@ -1,11 +1,16 @@
-import os
+import re
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Query, status
-from fastapi.responses import JSONResponse
+import asyncio
+from os.path import splitext
+from pathlib import Path
+from typing import List, Optional, AsyncIterator, Dict, Any, BinaryIO
+import aiofiles
+import orjson
+from fastapi import APIRouter, Request, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import structlog
 
-from app.services.parser_service import ParserService
+from app.services.parser_service import get_parser_service
 from app.models.schemas import (
     ParseJobResponse,
     MappingSuggestionRequest,
@@ -17,43 +22,107 @@ from app.models.schemas import (
     ParseStatus
 )
 from app.core.config import settings
+from app.utils.cleanup import schedule_removal
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-parser_service = ParserService()
+parser_service = get_parser_service()
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
+
+# Settings are fixed for the process lifetime, so resolve them once at import
+_MAX_BYTES = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+_ALLOWED = frozenset(settings.ALLOWED_EXTENSIONS)
+_ALLOWED_MESSAGE = f"File type not allowed. Allowed types: {', '.join(sorted(_ALLOWED))}"
+_TOO_LARGE_MESSAGE = f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
+_UPLOAD_DIR = settings.UPLOAD_DIR
+_EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+}
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def _safe_name(filename: str) -> str:
+    # Also neutralises path separators, so "../" in a client filename cannot escape UPLOAD_DIR
+    return _UNSAFE_FILENAME_CHARS.sub("_", filename)
+
+
+def _copy_upload(src: BinaryIO, dst: Path, limit: int) -> int:
+    """Copy an upload to disk in 1MB blocks, stopping once it passes ``limit``"""
+    copied = 0
+    with open(dst, "wb") as f:
+        while copied <= limit and (chunk := src.read(UPLOAD_CHUNK_SIZE)):
+            f.write(chunk)
+            copied += len(chunk)
+    return copied
+
+
+def _file_extension(filename: str) -> str:
+    ext = splitext(filename)[1].lstrip(".").lower()
+    if not ext:
+        raise HTTPException(status_code=400, detail="File has no extension")
+    return ext
+
+
+async def _ndjson(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) + b"\n"
+
+
+async def _iter_file(path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """Read an upload in chunks, aborting as soon as it exceeds the size limit"""
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > _MAX_BYTES:
+            raise HTTPException(status_code=400, detail=_TOO_LARGE_MESSAGE)
+    return bytes(buffer)
 
 
 @router.post("/upload", response_model=ParseJobResponse)
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
     business_context: str = Query("general", description="Business context for parsing")
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    file_extension = file.filename.split(".")[-1].lower()
-    if file_extension not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS)}"
-        )
+    file_extension = _file_extension(file.filename)
+    if file_extension not in _ALLOWED:
+        raise HTTPException(status_code=400, detail=_ALLOWED_MESSAGE)
     
-    file_size = 0
-    contents = await file.read()
-    file_size = len(contents)
+    # Reject oversized bodies up front; chunked uploads are still capped while streaming below
+    try:
+        content_length = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if content_length > _MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=_TOO_LARGE_MESSAGE)
     
-    if file_size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
-        )
+    job_id = uuid.uuid4().hex
+    file_path = _UPLOAD_DIR.joinpath(f"{job_id}_{_safe_name(file.filename)}")
     
-    job_id = str(uuid.uuid4())
-    file_path = settings.UPLOAD_DIR / f"{job_id}_{file.filename}"
+    # Copy straight from the multipart spool file in a worker thread; no full-body bytes object
+    try:
+        await file.seek(0)
+        file_size = await asyncio.to_thread(_copy_upload, file.file, file_path, _MAX_BYTES)
+    except Exception:
+        schedule_removal(file_path)
+        raise
     
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    if file_size > _MAX_BYTES:
+        schedule_removal(file_path)
+        raise HTTPException(status_code=400, detail=_TOO_LARGE_MESSAGE)
     
     try:
         result = await parser_service.start_parsing(
@@ -71,8 +140,7 @@ async def upload_file(
         )
     except Exception as e:
         logger.error("Failed to start parsing", job_id=job_id, error=str(e))
-        if file_path.exists():
-            os.unlink(file_path)
+        schedule_removal(file_path)
         raise HTTPException(status_code=500, detail="Failed to start parsing")
 
 
@@ -90,28 +158,39 @@ async def get_job_status(job_id: str):
 async def preview_file(
     file: UploadFile = File(...),
     rows: int = Query(10, description="Number of rows to preview"),
-    sheet_name: Optional[str] = Query(None, description="Excel sheet name or index")
+    sheet_name: Optional[str] = Query(None, description="Excel sheet name or index"),
+    stream: bool = Query(False, description="Stream rows as newline-delimited JSON")
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    contents = await file.read()
+    # Reject unsupported files before reading the body
+    file_extension = _file_extension(file.filename)
+    if file_extension not in _ALLOWED:
+        raise HTTPException(status_code=400, detail=_ALLOWED_MESSAGE)
+    
+    contents = await _read_upload(file)
     
     try:
         # Check if it's an Excel file and user wants sheet info
-        file_extension = file.filename.split(".")[-1].lower()
         if file_extension in ["xlsx", "xls"] and sheet_name is None:
             # Return sheet information for Excel files
             sheets_info = await parser_service.get_excel_sheets_info(contents, file.filename)
             if sheets_info:
-                return JSONResponse(content={
+                return ORJSONResponse(content={
                     "type": "excel_sheets",
                     "sheets": sheets_info,
                     "message": "Please select a sheet to preview"
                 })
         
+        if stream and sheet_name is None:
+            return StreamingResponse(
+                _ndjson(parser_service.stream_preview(contents, file.filename, rows)),
+                media_type="application/x-ndjson"
+            )
+        
         preview_data = await parser_service.preview_file(contents, file.filename, rows, sheet_name)
-        return JSONResponse(content=preview_data)
+        return ORJSONResponse(content=preview_data)
     except Exception as e:
         logger.error("Failed to preview file", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to preview file")
@@ -155,13 +234,14 @@ async def validate_data(request: ValidationRequest):
             rules=request.rules
         )
         
-        return ValidationResponse(
-            job_id=request.job_id,
-            valid=validation_results["valid"],
-            errors=validation_results["errors"],
-            warnings=validation_results["warnings"],
-            summary=validation_results["summary"]
-        )
+        # Returned as a dict so response_model validates it once, not twice
+        return {
+            "job_id": request.job_id,
+            "valid": validation_results["valid"],
+            "errors": validation_results["errors"],
+            "warnings": validation_results["warnings"],
+            "summary": validation_results["summary"]
+        }
     except Exception as e:
         logger.error("Failed to validate data", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to validate data")
@@ -176,12 +256,12 @@ async def clean_data(request: CleaningRequest):
             cleaning_rules=request.cleaning_rules
         )
         
-        return CleaningResponse(
-            job_id=request.job_id,
-            cleaned_data=cleaned_data["data"],
-            changes_summary=cleaned_data["changes"],
-            total_changes=cleaned_data["total_changes"]
-        )
+        return {
+            "job_id": request.job_id,
+            "cleaned_data": cleaned_data["data"],
+            "changes_summary": cleaned_data["changes"],
+            "total_changes": cleaned_data["total_changes"]
+        }
     except Exception as e:
         logger.error("Failed to clean data", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to clean data")
@@ -198,7 +278,7 @@ async def export_data(
         if not export_data:
             raise HTTPException(status_code=404, detail="Job not found or data not ready")
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "download_url": export_data["url"],
             "file_name": export_data["filename"],
             "format": format
@@ -208,6 +288,31 @@ async def export_data(
         raise HTTPException(status_code=500, detail="Failed to export data")
 
 
+@router.get("/export/{job_id}/download")
+async def download_export(
+    job_id: str,
+    format: str = Query("csv", description="Export format: csv, xlsx, json")
+):
+    if format not in _EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    
+    try:
+        export_data = await parser_service.export_data(job_id, format)
+    except Exception as e:
+        logger.error("Failed to export data", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to export data")
+    
+    if not export_data:
+        raise HTTPException(status_code=404, detail="Job not found or data not ready")
+    
+    # Stream the rendered file from disk rather than loading it into the response body
+    return StreamingResponse(
+        _iter_file(export_data["path"]),
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_data["filename"]}"'}
+    )
+
+
 @router.get("/metrics/{job_id}")
 async def get_metrics(job_id: str):
     metrics = await parser_service.get_job_metrics(job_id)
@@ -215,7 +320,7 @@ async def get_metrics(job_id: str):
     if not metrics:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return JSONResponse(content=metrics)
+    return ORJSONResponse(content=metrics)
 
 
 @router.post("/excel/sheets")
@@ -224,15 +329,15 @@ async def get_excel_sheets(file: UploadFile = File(...)):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    file_extension = file.filename.split(".")[-1].lower()
+    file_extension = _file_extension(file.filename)
     if file_extension not in ["xlsx", "xls"]:
         raise HTTPException(status_code=400, detail="File must be an Excel file")
     
-    contents = await file.read()
+    contents = await _read_upload(file)
     
     try:
         sheets_info = await parser_service.get_excel_sheets_info(contents, file.filename)
-        return JSONResponse(content={"sheets": sheets_info})
+        return ORJSONResponse(content={"sheets": sheets_info})
     except Exception as e:
         logger.error("Failed to get Excel sheets", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to get Excel sheets")
@@ -248,7 +353,10 @@ async def preview_excel_sheet(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    contents = await file.read()
+    if _file_extension(file.filename) not in ["xlsx", "xls"]:
+        raise HTTPException(status_code=400, detail="File must be an Excel file")
+    
+    contents = await _read_upload(file)
     
     try:
         # Try to parse sheet_name as integer if possible
@@ -259,7 +367,7 @@ async def preview_excel_sheet(
             sheet_identifier = sheet_name
         
         preview_data = await parser_service.preview_excel_sheet(contents, file.filename, sheet_identifier, rows)
-        return JSONResponse(content=preview_data)
+        return ORJSONResponse(content=preview_data)
     except Exception as e:
         logger.error("Failed to preview Excel sheet", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to preview Excel sheet")
@@ -278,7 +386,10 @@ async def extract_json_from_excel(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    contents = await file.read()
+    if _file_extension(file.filename) not in ["xlsx", "xls"]:
+        raise HTTPException(status_code=400, detail="File must be an Excel file")
+    
+    contents = await _read_upload(file)
     
     try:
         # Try to parse sheet_name as integer if possible
@@ -298,7 +409,7 @@ async def extract_json_from_excel(
             columns=columns
         )
         
-        return JSONResponse(content=json_data)
+        return ORJSONResponse(content=json_data)
     except Exception as e:
         logger.error("Failed to extract JSON from Excel", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,24 +1,40 @@
-import json
-from typing import Optional, Any
+import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from typing import Optional, Any, Dict, List, Set, Tuple, AsyncIterator
 import redis.asyncio as redis
-from redis.asyncio.connection import ConnectionPool
+from redis.asyncio.connection import BlockingConnectionPool, HIREDIS_AVAILABLE
+from cachetools import TTLCache
 import structlog
 
 from app.core.config import settings
 
 logger = structlog.get_logger()
 
-pool: Optional[ConnectionPool] = None
+pool: Optional[BlockingConnectionPool] = None
 redis_client: Optional[redis.Redis] = None
 
+_MISS = object()
+
 
 async def init_redis():
     global pool, redis_client
+    if redis_client is not None:
+        # The module-level client is shared by every handler; never build a second pool
+        return
+    
     try:
-        pool = ConnectionPool.from_url(settings.REDIS_URL, decode_responses=True)
+        # Bounded pool: callers wait for a free connection instead of opening unlimited sockets
+        pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=5,
+            health_check_interval=30,
+            socket_keepalive=True,
+        )
         redis_client = redis.Redis(connection_pool=pool)
         await redis_client.ping()
-        logger.info("Redis connection established")
+        logger.info("Redis connection established", hiredis=HIREDIS_AVAILABLE)
     except Exception as e:
         logger.error("Failed to connect to Redis", error=str(e))
         redis_client = None
@@ -31,35 +47,154 @@ async def get_redis() -> Optional[redis.Redis]:
 class CacheManager:
     def __init__(self, prefix: str = "csv_parser"):
         self.prefix = prefix
+        # Per-process read-through layer for read-mostly keys. Only keys callers mark as
+        # local_cacheable live here; mutable, cross-worker state (job data) always goes to Redis.
+        self._local = TTLCache(maxsize=1024, ttl=30)
+        # Every subscription in this process shares one pub/sub connection
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
     
     def _make_key(self, key: str) -> str:
         return f"{self.prefix}:{key}"
     
-    async def get(self, key: str) -> Optional[Any]:
+    async def get(self, key: str, local_cacheable: bool = False) -> Optional[Any]:
+        if local_cacheable:
+            cached = self._local.get(key, _MISS)
+            if cached is not _MISS:
+                return cached
+        
         if not redis_client:
             return None
         
         try:
             value = await redis_client.get(self._make_key(key))
-            return json.loads(value) if value else None
+            result = orjson.loads(value) if value else None
+            if local_cacheable and result is not None:
+                self._local[key] = result
+            return result
         except Exception as e:
             logger.error("Cache get error", key=key, error=str(e))
             return None
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        local_cacheable: bool = False
+    ) -> bool:
+        # Always invalidate on mutation; never rely on the local TTL alone
+        self._local.pop(key, None)
+        
         if not redis_client:
             return False
         
         try:
-            serialized = json.dumps(value)
+            serialized = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
             ttl = ttl or settings.CACHE_TTL
             await redis_client.setex(self._make_key(key), ttl, serialized)
+            if local_cacheable:
+                self._local[key] = value
             return True
         except Exception as e:
             logger.error("Cache set error", key=key, error=str(e))
             return False
     
+    async def mget(self, keys: List[str], local_cacheable: bool = False) -> List[Optional[Any]]:
+        results: List[Optional[Any]] = [None] * len(keys)
+        missing = []
+        for idx, key in enumerate(keys):
+            cached = self._local.get(key, _MISS) if local_cacheable else _MISS
+            if cached is _MISS:
+                missing.append(idx)
+            else:
+                results[idx] = cached
+        
+        if not redis_client or not missing:
+            return results
+        
+        try:
+            values = await redis_client.mget([self._make_key(keys[idx]) for idx in missing])
+            for idx, value in zip(missing, values):
+                if value:
+                    results[idx] = orjson.loads(value)
+                    if local_cacheable:
+                        self._local[keys[idx]] = results[idx]
+            return results
+        except Exception as e:
+            logger.error("Cache mget error", keys=keys, error=str(e))
+            return results
+    
+    async def mset(self, items: List[Tuple[str, Any, Optional[int]]]) -> bool:
+        # (key, value, ttl) triples written in one pipelined round-trip
+        if not redis_client or not items:
+            return False
+        
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, value, ttl in items:
+                    self._local.pop(key, None)
+                    pipe.setex(
+                        self._make_key(key),
+                        ttl or settings.CACHE_TTL,
+                        orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+                    )
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("Cache mset error", keys=[item[0] for item in items], error=str(e))
+            return False
+    
+    async def pipeline_set(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        return await self.mset([(key, value, ttl) for key, value in items.items()])
+    
+    async def hgetall(self, key: str) -> Optional[Dict[str, Any]]:
+        if not redis_client:
+            return None
+        
+        try:
+            values = await redis_client.hgetall(self._make_key(key))
+            return {field.decode(): orjson.loads(value) for field, value in values.items()} or None
+        except Exception as e:
+            logger.error("Cache hgetall error", key=key, error=str(e))
+            return None
+    
+    async def hmget(self, key: str, fields: List[str]) -> Dict[str, Any]:
+        # Fields that are not set are left out of the result
+        if not redis_client:
+            return {}
+        
+        try:
+            values = await redis_client.hmget(self._make_key(key), fields)
+            return {field: orjson.loads(value) for field, value in zip(fields, values) if value}
+        except Exception as e:
+            logger.error("Cache hmget error", key=key, error=str(e))
+            return {}
+    
+    async def hset(self, key: str, fields: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        # Each field is its own JSON value, so updating one never resends the others
+        self._local.pop(key, None)
+        
+        if not redis_client or not fields:
+            return False
+        
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(self._make_key(key), mapping={
+                    field: orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+                    for field, value in fields.items()
+                })
+                pipe.expire(self._make_key(key), ttl or settings.CACHE_TTL)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("Cache hset error", key=key, error=str(e))
+            return False
+    
     async def delete(self, key: str) -> bool:
+        self._local.pop(key, None)
+        
         if not redis_client:
             return False
         
@@ -79,6 +214,66 @@ class CacheManager:
         except Exception as e:
             logger.error("Cache exists error", key=key, error=str(e))
             return False
+    
+    async def publish(self, channel: str, payload: Any) -> bool:
+        if not redis_client:
+            return False
+        
+        try:
+            await redis_client.publish(
+                self._make_key(channel),
+                orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+            )
+            return True
+        except Exception as e:
+            logger.error("Cache publish error", channel=channel, error=str(e))
+            return False
+    
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        # Yields a queue that receives each payload published to channel
+        queue: asyncio.Queue = asyncio.Queue()
+        subscribers = self._subscribers.setdefault(channel, set())
+        subscribers.add(queue)
+        
+        try:
+            if redis_client and len(subscribers) == 1:
+                try:
+                    if self._pubsub is None:
+                        self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                    await self._pubsub.subscribe(self._make_key(channel))
+                    if self._listener is None:
+                        self._listener = asyncio.create_task(self._listen())
+                except Exception as e:
+                    logger.error("Cache subscribe error", channel=channel, error=str(e))
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers and self._subscribers.get(channel) is subscribers:
+                del self._subscribers[channel]
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(self._make_key(channel))
+                    except Exception as e:
+                        logger.error("Cache unsubscribe error", channel=channel, error=str(e))
+    
+    async def _listen(self):
+        prefix = f"{self.prefix}:"
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if not message or message["type"] != "message":
+                    continue
+                
+                channel = message["channel"].decode()[len(prefix):]
+                payload = orjson.loads(message["data"])
+                for queue in self._subscribers.get(channel, ()):
+                    queue.put_nowait(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Cache listen error", error=str(e))
+                await asyncio.sleep(1)
 
 
 cache_manager = CacheManager()
\ No newline at end of file
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Optional
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,9 +16,11 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str
     GEMINI_MODEL: str = "gemini-1.5-flash"
     GEMINI_MAX_TOKENS: int = 4000
+    GEMINI_MAX_CONCURRENCY: int = 8
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_POOL_SIZE: int = 50
     CACHE_TTL: int = 86400
     
     # Database
@@ -54,10 +57,11 @@ class Settings(BaseSettings):
     # Cost Tracking
     MAX_COST_PER_FILE: float = 0.10
     COST_WARNING_THRESHOLD: float = 0.05
-    
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.UPLOAD_DIR.mkdir(exist_ok=True)
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+
+@lru_cache(maxsize=1)
+def ensure_upload_dir():
+    settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -1,7 +1,17 @@
-import json
-from typing import Dict, List, Optional, Any
+import random
+import asyncio
+import hashlib
+import orjson
+from functools import cached_property
+from typing import Dict, List, Optional, Any, Tuple
+from cachetools import TTLCache
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
+from google.api_core.exceptions import (
+    DeadlineExceeded,
+    InternalServerError,
+    ResourceExhausted,
+    ServiceUnavailable,
+)
 import structlog
 
 from app.core.config import settings
@@ -9,44 +19,186 @@ from app.core.cache import cache_manager
 
 logger = structlog.get_logger()
 
+# The SDK caches one default async client per process, so every generate_content_async
+# call reuses the same gRPC (HTTP/2) channel; no per-call TCP/TLS handshake to pool away.
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+# (key, value, ttl) deferred to a single CacheManager.mset
+CacheWrite = Tuple[str, Any, Optional[int]]
+
+# Only rate limits, 5xx and timeouts are worth paying for another call
+_RETRYABLE_ERRORS = (ResourceExhausted, InternalServerError, ServiceUnavailable, DeadlineExceeded)
+_MAX_ATTEMPTS = 3
+_RETRY_BASE_SECONDS = 4
+_RETRY_CAP_SECONDS = 10
+
+MAPPING_SAMPLE_ROWS = 5
+RULE_SAMPLE_VALUES = 10
+
+# A response that failed to parse stays cached just long enough to absorb repeats
+_NEGATIVE_CACHE_TTL_SECONDS = 60
+
+# Bounds in-flight model calls only; cache hits never wait on it
+_model_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
+
+def _dumps(value: Any) -> str:
+    # Compact on purpose: indentation roughly doubles prompt tokens for tabular samples
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    # Sample data can carry pandas timestamps and other non-JSON scalars
+    return orjson.dumps(value, default=str, option=option).decode()
+
 
 class GeminiClient:
     def __init__(self):
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
         self.cache_prefix = "gemini"
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation_configs: Dict[float, genai.types.GenerationConfig] = {}
+    
+    # Built lazily in the worker that first uses it; `del client.model` resets it
+    @cached_property
+    def model(self) -> genai.GenerativeModel:
+        return genai.GenerativeModel(settings.GEMINI_MODEL)
+    
+    @cached_property
+    def _local(self) -> TTLCache:
+        return TTLCache(maxsize=4096, ttl=300)
     
     def _make_cache_key(self, prompt: str, context: Optional[Dict] = None) -> str:
-        cache_data = {"prompt": prompt, "context": context or {}}
-        return f"{self.cache_prefix}:{hash(json.dumps(cache_data, sort_keys=True))}"
+        # Deterministic across processes, unlike hash(), so workers share cache entries
+        cache_data = orjson.dumps(
+            {"prompt": prompt, "context": context or {}},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return f"{self.cache_prefix}:{hashlib.blake2b(cache_data, digest_size=16).hexdigest()}"
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def generate(
         self,
         prompt: str,
         context: Optional[Dict] = None,
         use_cache: bool = True,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        cache_writes: Optional[List[CacheWrite]] = None
     ) -> Dict[str, Any]:
+        response, _ = await self._generate(prompt, context, use_cache, temperature, cache_writes)
+        return response
+    
+    async def _generate(
+        self,
+        prompt: str,
+        context: Optional[Dict] = None,
+        use_cache: bool = True,
+        temperature: float = 0.7,
+        cache_writes: Optional[List[CacheWrite]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """The response, and whether this call generated it rather than reading it from a cache"""
+        if not use_cache:
+            return await self._call_model(prompt, temperature), True
+        
         cache_key = self._make_cache_key(prompt, context)
         
-        if use_cache:
+        # In-process hit: no Redis round-trip
+        local_response = self._local.get(cache_key)
+        if local_response:
+            return local_response, False
+        
+        # Single-flight: concurrent identical prompts await the first caller's result
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight), False
+            except asyncio.CancelledError:
+                # Only our own cancellation propagates; if the first caller was cancelled, look again
+                if asyncio.current_task().cancelling():
+                    raise
+                return await self._generate(prompt, context, use_cache, temperature, cache_writes)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
             cached_response = await cache_manager.get(cache_key)
+            generated = not cached_response
             if cached_response:
-                logger.info("Using cached LLM response", cache_key=cache_key)
-                return cached_response
+                logger.debug("Using cached LLM response", cache_key=cache_key)
+                result = cached_response
+            else:
+                result = await self._call_model(prompt, temperature)
+                if cache_writes is None:
+                    await cache_manager.set(cache_key, result)
+                else:
+                    # The caller flushes this together with its own writes
+                    cache_writes.append((cache_key, result, None))
+            
+            self._local[cache_key] = result
+            future.set_result(result)
+            return result, generated
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved so asyncio doesn't warn when nobody was waiting
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+    
+    async def _shorten_cached(
+        self,
+        prompt: str,
+        context: Optional[Dict],
+        response: Dict[str, Any],
+        generated: bool,
+        cache_writes: Optional[List[CacheWrite]] = None
+    ):
+        cache_key = self._make_cache_key(prompt, context)
+        self._local.pop(cache_key, None)
         
+        # A cached copy was shortened by the call that generated it; writing it again would keep extending its TTL
+        if not generated:
+            return
+        
+        if cache_writes is None:
+            await cache_manager.set(cache_key, response, ttl=_NEGATIVE_CACHE_TTL_SECONDS)
+        else:
+            cache_writes[:] = [item for item in cache_writes if item[0] != cache_key]
+            cache_writes.append((cache_key, response, _NEGATIVE_CACHE_TTL_SECONDS))
+    
+    async def _call_model(self, prompt: str, temperature: float) -> Dict[str, Any]:
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            try:
+                async with _model_semaphore:
+                    return await self._request_model(prompt, temperature)
+            except _RETRYABLE_ERRORS as e:
+                if attempt == _MAX_ATTEMPTS:
+                    raise
+                
+                # Full jitter keeps rate-limited workers from retrying in lockstep
+                delay = random.uniform(0, min(_RETRY_CAP_SECONDS, _RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+                logger.warning("Retrying Gemini request", attempt=attempt, delay=round(delay, 2), error=str(e))
+                await asyncio.sleep(delay)
+    
+    def _generation_config(self, temperature: float) -> genai.types.GenerationConfig:
+        # Callers use a handful of temperatures; build each config once and reuse it
+        config = self._generation_configs.get(temperature)
+        if config is None:
+            config = genai.types.GenerationConfig(
+                temperature=temperature,
+                max_output_tokens=settings.GEMINI_MAX_TOKENS,
+            )
+            self._generation_configs[temperature] = config
+        return config
+    
+    async def _request_model(self, prompt: str, temperature: float) -> Dict[str, Any]:
+        # Output is capped at GEMINI_MAX_TOKENS (a few KB of JSON), so a buffered
+        # response parsed once with orjson beats incremental stream parsing.
         try:
             response = await self.model.generate_content_async(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=temperature,
-                    max_output_tokens=settings.GEMINI_MAX_TOKENS,
-                )
+                generation_config=self._generation_config(temperature)
             )
             
-            result = {
+            return {
                 "text": response.text,
                 "usage": {
                     "prompt_tokens": response.usage_metadata.prompt_token_count,
@@ -55,12 +207,7 @@ class GeminiClient:
                 },
                 "finish_reason": response.candidates[0].finish_reason.name,
             }
-            
-            if use_cache:
-                await cache_manager.set(cache_key, result)
-            
-            return result
-            
+        
         except Exception as e:
             logger.error("Gemini API error", error=str(e))
             raise
@@ -70,19 +217,26 @@ class GeminiClient:
         headers: List[str],
         sample_data: List[Dict],
         target_schema: Dict[str, str],
-        business_context: str = "general"
+        business_context: str = "general",
+        cache_writes: Optional[List[CacheWrite]] = None
     ) -> Dict[str, Dict[str, Any]]:
+        # Only the first rows and the requested columns reach the prompt
+        sample_data = [
+            {col: row.get(col) for col in headers}
+            for row in sample_data[:MAPPING_SAMPLE_ROWS]
+        ]
+        
         prompt = f"""You are an expert data analyst. Map the CSV columns to the target schema.
 
 Business Context: {business_context}
 
 CSV Headers: {headers}
 
-Sample Data (first 5 rows):
-{json.dumps(sample_data[:5], indent=2)}
+Sample Data (first {MAPPING_SAMPLE_ROWS} rows):
+{_dumps(sample_data)}
 
 Target Schema Fields:
-{json.dumps(target_schema, indent=2)}
+{_dumps(target_schema)}
 
 Instructions:
 1. Analyze the headers and sample data
@@ -103,13 +257,15 @@ Return JSON in this format:
 }}
 """
         
-        response = await self.generate(prompt, {"business_context": business_context})
+        cache_context = {"business_context": business_context}
+        response, generated = await self._generate(prompt, cache_context, cache_writes=cache_writes)
         
         try:
-            result = json.loads(response["text"])
+            result = orjson.loads(response["text"])
             return result.get("mappings", {})
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.error("Failed to parse LLM mapping response")
+            await self._shorten_cached(prompt, cache_context, response, generated, cache_writes)
             return {}
     
     async def generate_validation_rules(
@@ -119,6 +275,8 @@ Return JSON in this format:
         sample_values: List[Any],
         business_context: str = "general"
     ) -> List[Dict[str, Any]]:
+        sample_values = sample_values[:RULE_SAMPLE_VALUES]
+        
         prompt = f"""Generate validation rules for a data field.
 
 Field Name: {field_name}
@@ -126,7 +284,7 @@ Field Type: {field_type}
 Business Context: {business_context}
 
 Sample Values:
-{json.dumps(sample_values[:10], indent=2)}
+{_dumps(sample_values)}
 
 Generate appropriate validation rules based on the data patterns and business context.
 
@@ -141,12 +299,14 @@ Return JSON array of validation rules:
 ]
 """
         
-        response = await self.generate(prompt, {"field": field_name})
+        cache_context = {"field": field_name}
+        response, generated = await self._generate(prompt, cache_context)
         
         try:
-            return json.loads(response["text"])
-        except json.JSONDecodeError:
+            return orjson.loads(response["text"])
+        except orjson.JSONDecodeError:
             logger.error("Failed to parse validation rules")
+            await self._shorten_cached(prompt, cache_context, response, generated)
             return []
     
     async def clean_value(
@@ -156,12 +316,12 @@ Return JSON array of validation rules:
         field_type: str,
         context: Dict[str, Any]
     ) -> Dict[str, Any]:
+        # Everything but the value comes first, so calls for one field share a prompt prefix
         prompt = f"""Clean and standardize this data value.
 
 Field: {field_name}
 Type: {field_type}
-Value: "{value}"
-Context: {json.dumps(context, indent=2)}
+Context: {_dumps(context)}
 
 Instructions:
 1. Clean and standardize the value
@@ -175,23 +335,74 @@ Return JSON:
     "changes_made": ["list of changes"],
     "confidence": 0.95
 }}
+
+Value: "{value}"
 """
         
-        response = await self.generate(
-            prompt,
-            {"field": field_name, "value": value},
-            temperature=0.3
-        )
+        cache_context = {"field": field_name, "value": value}
+        response, generated = await self._generate(prompt, cache_context, temperature=0.3)
         
         try:
-            return json.loads(response["text"])
-        except json.JSONDecodeError:
+            return orjson.loads(response["text"])
+        except orjson.JSONDecodeError:
+            await self._shorten_cached(prompt, cache_context, response, generated)
             return {
                 "cleaned_value": value,
                 "changes_made": [],
                 "confidence": 0.0
             }
     
+    async def clean_values_batch(
+        self,
+        values: List[str],
+        field_name: str,
+        field_type: str,
+        context: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        # Values go last so every batch for a field shares the same prompt prefix
+        prompt = f"""Clean and standardize these data values.
+
+Field: {field_name}
+Type: {field_type}
+Context: {_dumps(context)}
+
+Instructions:
+1. Clean and standardize each value
+2. Fix obvious typos and formatting issues
+3. Ensure consistency with the field type
+4. Maintain data integrity
+
+Return a JSON array with exactly one result per input value, in the same order:
+[
+    {{
+        "cleaned_value": "the cleaned value",
+        "changes_made": ["list of changes"],
+        "confidence": 0.95
+    }}
+]
+
+Values:
+{_dumps(values)}
+"""
+        
+        cache_context = {"field": field_name, "values": values}
+        response, generated = await self._generate(prompt, cache_context, temperature=0.3)
+        
+        try:
+            results = orjson.loads(response["text"])
+        except orjson.JSONDecodeError:
+            results = None
+        
+        if not isinstance(results, list) or len(results) != len(values):
+            logger.error("Failed to parse batch cleaning response", field=field_name, count=len(values))
+            await self._shorten_cached(prompt, cache_context, response, generated)
+            return [
+                {"cleaned_value": value, "changes_made": [], "confidence": 0.0}
+                for value in values
+            ]
+        
+        return results
+    
     def estimate_cost(self, token_count: int) -> float:
         # Gemini 1.5 Flash pricing (approximate)
         input_cost_per_million = 0.35
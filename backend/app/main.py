@@ -1,12 +1,27 @@
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import pandas as pd
 import structlog
 
 from app.api.routes import parser, health
-from app.core.config import settings
+from app.core.config import settings, ensure_upload_dir
 from app.core.cache import init_redis
+from app.utils.cleanup import start_cleanup_worker, stop_cleanup_worker
+
+# Below LOG_LEVEL, log calls return before any processor runs; loggers bind once
+structlog.configure(
+    wrapper_class=structlog.make_filtering_bound_logger(
+        getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
+    ),
+    cache_logger_on_first_use=True,
+)
+
+# Derived frames share column data until written to, instead of copying eagerly
+pd.set_option("mode.copy_on_write", True)
 
 logger = structlog.get_logger()
 
@@ -15,7 +30,9 @@ logger = structlog.get_logger()
 async def lifespan(app: FastAPI):
     logger.info("Starting up CSV Parser API", version=settings.VERSION)
     await init_redis()
+    start_cleanup_worker()
     yield
+    await stop_cleanup_worker()
     logger.info("Shutting down CSV Parser API")
 
 
@@ -24,6 +41,7 @@ app = FastAPI(
     description="Intelligent CSV/Excel parser using Gemini AI",
     version=settings.VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
 )
@@ -39,6 +57,8 @@ app.add_middleware(
 app.include_router(health.router, prefix=f"{settings.API_PREFIX}/health", tags=["health"])
 app.include_router(parser.router, prefix=f"{settings.API_PREFIX}/parse", tags=["parser"])
 
+ensure_upload_dir()
+
 if settings.UPLOAD_DIR.exists():
     app.mount("/uploads", StaticFiles(directory=str(settings.UPLOAD_DIR)), name="uploads")
 
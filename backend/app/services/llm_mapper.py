@@ -1,4 +1,7 @@
+import re
+import hashlib
 from typing import Dict, List, Any, Optional
+import orjson
 import structlog
 
 from app.core.llm_client import gemini_client
@@ -7,6 +10,12 @@ from app.utils.patterns import PatternMatcher
 
 logger = structlog.get_logger()
 
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Stands in for the schema fingerprint when the schema was generated from the headers themselves
+DEFAULT_SCHEMA_KEY = "default"
+
 
 class LLMMapper:
     def __init__(self):
@@ -18,63 +27,85 @@ class LLMMapper:
         headers: List[str],
         sample_data: List[Dict[str, Any]],
         target_schema: Dict[str, str],
-        business_context: str = "general"
+        business_context: str = "general",
+        derived_schema: bool = False
     ) -> Dict[str, Dict[str, Any]]:
         # Level 1: Try pattern matching first
         pattern_mappings = self.pattern_matcher.match_columns(headers, target_schema)
         
-        # Filter high-confidence pattern matches
-        high_confidence_mappings = {
-            col: mapping
-            for col, mapping in pattern_mappings.items()
-            if mapping.get("confidence", 0) >= 0.9
-        }
-        
-        # Identify columns that need LLM mapping
-        unmapped_columns = [
-            col for col in headers
-            if col not in high_confidence_mappings
-        ]
+        # Split headers into high-confidence pattern matches and columns that need the LLM
+        high_confidence_mappings = {}
+        unmapped_columns = []
+        for col in headers:
+            mapping = pattern_mappings.get(col)
+            if mapping and mapping.get("confidence", 0) >= 0.9:
+                high_confidence_mappings[col] = mapping
+            else:
+                unmapped_columns.append(col)
         
         if not unmapped_columns:
             logger.info("All columns mapped via patterns", count=len(headers))
             return pattern_mappings
         
-        # Level 2: Check cache for LLM mappings
-        cache_key = self._generate_cache_key(unmapped_columns, business_context)
-        cached_mappings = await cache_manager.get(f"{self.cache_prefix}:{cache_key}")
+        # Level 2: Per-column cached LLM mappings and stored user corrections in one round-trip.
+        # Columns are cached under a normalized name, so "Customer Name" reuses "customer_name".
+        # A schema built from the headers changes with every added or renamed column, so it stays out of the key
+        schema_key = DEFAULT_SCHEMA_KEY if derived_schema else self._schema_fingerprint(target_schema)
+        mapping_keys = [
+            self._column_cache_key(business_context, schema_key, col)
+            for col in unmapped_columns
+        ]
+        correction_keys = [
+            self._correction_key(business_context, col) for col in unmapped_columns
+        ]
+        cached = await cache_manager.mget(
+            [*mapping_keys, *correction_keys],
+            local_cacheable=True
+        )
+        cached_mappings = cached[:len(unmapped_columns)]
+        corrections = cached[len(unmapped_columns):]
         
-        if cached_mappings:
-            logger.info("Using cached LLM mappings", count=len(cached_mappings))
-            # Merge pattern and cached mappings
-            return {**high_confidence_mappings, **cached_mappings}
+        resolved_mappings = {}
+        for col, cached_mapping, correction in zip(unmapped_columns, cached_mappings, corrections):
+            if correction:
+                resolved_mappings[col] = {
+                    "target_field": correction["target"],
+                    "confidence": correction.get("confidence", 1.0),
+                    "reasoning": "User correction"
+                }
+            elif cached_mapping and self._target_exists(cached_mapping, target_schema):
+                resolved_mappings[col] = cached_mapping
+        
+        if resolved_mappings:
+            logger.info("Using cached column mappings", count=len(resolved_mappings))
+        
+        unmapped_columns = [col for col in unmapped_columns if col not in resolved_mappings]
+        if not unmapped_columns:
+            return high_confidence_mappings | resolved_mappings
         
         # Level 3: Use LLM for remaining columns
         logger.info("Requesting LLM mappings", columns=unmapped_columns)
         
-        # Prepare sample data for unmapped columns
-        unmapped_sample_data = [
-            {col: row.get(col) for col in unmapped_columns}
-            for row in sample_data
-        ]
-        
+        # The client trims sample rows to the unmapped columns
+        cache_writes = []
         llm_mappings = await gemini_client.map_columns(
             headers=unmapped_columns,
-            sample_data=unmapped_sample_data,
+            sample_data=sample_data,
             target_schema=target_schema,
-            business_context=business_context
+            business_context=business_context,
+            cache_writes=cache_writes
         )
         
-        # Cache the LLM mappings
-        if llm_mappings:
-            await cache_manager.set(
-                f"{self.cache_prefix}:{cache_key}",
-                llm_mappings,
-                ttl=86400 * 7  # Cache for 7 days
-            )
+        # Cache each LLM mapping with the client's response entry in one round-trip
+        cache_writes.extend(
+            (self._column_cache_key(business_context, schema_key, col), llm_mappings[col], 86400 * 7)  # Cache for 7 days
+            for col in unmapped_columns
+            if col in llm_mappings
+        )
+        await cache_manager.mset(cache_writes)
         
         # Merge all mappings
-        final_mappings = {**high_confidence_mappings}
+        final_mappings = high_confidence_mappings | resolved_mappings
         
         for col in unmapped_columns:
             if col in llm_mappings:
@@ -92,11 +123,25 @@ class LLMMapper:
         
         return final_mappings
     
-    def _generate_cache_key(self, columns: List[str], context: str) -> str:
-        # Create a deterministic cache key
-        sorted_columns = sorted(columns)
-        key_string = f"{context}:{':'.join(sorted_columns)}"
-        return str(hash(key_string))
+    def _correction_key(self, context: str, column: str) -> str:
+        return f"correction:{context}:{column.lower()}"
+    
+    def _normalize_header(self, column: str) -> str:
+        # customerName, Customer Name and customer-name all become customer_name
+        return _NON_ALNUM.sub("_", _CAMEL_BOUNDARY.sub("_", column.strip()).lower()).strip("_")
+    
+    def _schema_fingerprint(self, target_schema: Dict[str, str]) -> str:
+        # Stable across processes and restarts; a cached target must exist in the schema it came from
+        key_data = orjson.dumps(target_schema, option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(key_data, digest_size=8).hexdigest()
+    
+    def _target_exists(self, mapping: Dict[str, Any], target_schema: Dict[str, str]) -> bool:
+        # Under the default key a cached target may name a column this file doesn't have
+        target_field = mapping.get("target_field")
+        return target_field is None or target_field in target_schema
+    
+    def _column_cache_key(self, context: str, schema_key: str, column: str) -> str:
+        return f"{self.cache_prefix}:{context}:{schema_key}:{self._normalize_header(column)}"
     
     async def improve_mapping(
         self,
@@ -105,12 +150,14 @@ class LLMMapper:
         context: str
     ):
         # Learn from user corrections for future mappings
-        for source_col, target_field in user_correction.items():
-            if source_col in original_mapping:
-                # Store the correction pattern
-                pattern_key = f"correction:{context}:{source_col.lower()}"
-                await cache_manager.set(
-                    pattern_key,
-                    {"target": target_field, "confidence": 1.0},
-                    ttl=86400 * 30  # Remember for 30 days
-                )
\ No newline at end of file
+        corrections = {
+            self._correction_key(context, source_col): {"target": target_field, "confidence": 1.0}
+            for source_col, target_field in user_correction.items()
+            if source_col in original_mapping
+        }
+        
+        # Store all correction patterns in a single round-trip
+        await cache_manager.pipeline_set(
+            corrections,
+            ttl=86400 * 30  # Remember for 30 days
+        )
\ No newline at end of file
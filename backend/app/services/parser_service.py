@@ -1,22 +1,42 @@
+import os
 import json
+import time
+import shutil
 import asyncio
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator, Iterator
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from fastapi import WebSocket
 import structlog
+import xlsxwriter
 
 from app.core.cache import cache_manager
-from app.core.llm_client import gemini_client
+from app.core.llm_client import gemini_client, MAPPING_SAMPLE_ROWS
 from app.models.schemas import ParseStatus
 from app.services.llm_mapper import LLMMapper
-from app.services.validators import DataValidator
+from app.services.validators import DataValidator, ValidationTally
 from app.services.transformers import DataTransformer
-from app.utils.file_handler import FileHandler
+from app.utils.file_handler import FileHandler, CSV_CHUNK_ROWS
+from app.utils.websocket import BatchedWSSender
 
 logger = structlog.get_logger()
 
+_STATUS_MESSAGES: Dict[str, str] = {
+    ParseStatus.PENDING: "Job is queued for processing",
+    ParseStatus.PROCESSING: "Reading and analyzing file",
+    ParseStatus.MAPPING: "Generating intelligent column mappings",
+    ParseStatus.VALIDATING: "Validating data integrity",
+    ParseStatus.CLEANING: "Cleaning and standardizing data",
+    ParseStatus.COMPLETED: "Processing completed successfully",
+    ParseStatus.FAILED: "Processing failed"
+}
+
+# With no event for this long, a WebSocket re-reads the job in case an update was lost
+WS_STATUS_REFRESH_SECONDS = 5
+
 
 class ParserService:
     def __init__(self):
@@ -32,24 +52,25 @@ class ParserService:
         file_path: str,
         business_context: str
     ) -> Dict[str, Any]:
+        now = datetime.utcnow().isoformat()
         job_data = {
             "job_id": job_id,
             "status": ParseStatus.PROCESSING,
             "file_path": file_path,
             "business_context": business_context,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat(),
+            "created_at": now,
+            "updated_at": now,
             "progress": 0,
             "metrics": {
                 "llm_calls": 0,
                 "llm_tokens_used": 0,
                 "cache_hits": 0,
                 "cache_misses": 0,
-                "processing_start": datetime.utcnow().isoformat()
+                "processing_start": now
             }
         }
         
-        await cache_manager.set(f"{self.job_cache_prefix}:{job_id}", job_data)
+        await cache_manager.hset(self._job_key(job_id), job_data)
         
         # Start async processing
         asyncio.create_task(self._process_file(job_id, file_path, business_context))
@@ -57,79 +78,116 @@ class ParserService:
         return job_data
     
     async def _process_file(self, job_id: str, file_path: str, business_context: str):
+        # Elapsed time comes from the monotonic clock; wall-clock stamps are only for display
+        started = time.monotonic()
+        
         try:
             await self._update_job_status(job_id, ParseStatus.PROCESSING, progress=10)
             
-            # Read and parse file
-            df = await self.file_handler.read_file(file_path)
-            
-            job_data = await self._get_job_data(job_id)
-            job_data["row_count"] = len(df)
-            job_data["column_count"] = len(df.columns)
-            job_data["headers"] = df.columns.tolist()
-            
-            await self._update_job_data(job_id, job_data, progress=20)
-            
-            # Generate column mappings
-            await self._update_job_status(job_id, ParseStatus.MAPPING, progress=30)
-            
-            sample_data = df.head(10).to_dict(orient="records")
-            
-            # Here you would normally have a target schema, for demo we'll create one
-            target_schema = self._generate_default_schema(df.columns.tolist())
-            
-            mappings = await self.llm_mapper.map_columns(
-                headers=df.columns.tolist(),
-                sample_data=sample_data,
-                target_schema=target_schema,
-                business_context=business_context
-            )
-            
-            job_data["mappings"] = mappings
-            job_data["metrics"]["llm_calls"] += 1
-            
-            await self._update_job_data(job_id, job_data, progress=50)
+            cleaned_file_path = Path(file_path).parent / f"{job_id}_cleaned.csv"
+            job_data = None
+            mappings = None
+            column_rules = {}
+            validation_tally = ValidationTally()
+            data_changes = 0
+            row_count = 0
+            
+            # Read, validate, clean and write one chunk at a time so the whole file is never in memory
+            async for df, fraction_read in self.file_handler.iter_chunks(file_path):
+                if mappings is None:
+                    # Headers, mappings and validation rules all come from the first chunk
+                    headers = df.columns.tolist()
+                    job_data = await self._get_job_data(job_id)
+                    job_data["column_count"] = len(headers)
+                    job_data["headers"] = headers
+                    
+                    # Generate column mappings
+                    await self._update_job_status(
+                        job_id, ParseStatus.MAPPING, progress=30,
+                        fields={"column_count": job_data["column_count"], "headers": job_data["headers"]}
+                    )
+                    
+                    sample_data = df.head(MAPPING_SAMPLE_ROWS).to_dict(orient="records")
+                    
+                    # Here you would normally have a target schema, for demo we'll create one
+                    target_schema = self._generate_default_schema(headers)
+                    
+                    mappings = await self.llm_mapper.map_columns(
+                        headers=headers,
+                        sample_data=sample_data,
+                        target_schema=target_schema,
+                        business_context=business_context,
+                        derived_schema=True
+                    )
+                    
+                    job_data["mappings"] = mappings
+                    job_data["metrics"]["llm_calls"] += 1
+                    
+                    # Validate data
+                    await self._update_job_status(
+                        job_id, ParseStatus.VALIDATING, progress=60,
+                        fields={"mappings": mappings, "metrics": job_data["metrics"]}
+                    )
+                    
+                    column_rules = await self.validator.generate_rules(df, mappings, business_context)
+                    
+                    # Clean data
+                    await self._update_job_status(job_id, ParseStatus.CLEANING, progress=70)
+                
+                # Per-chunk pandas work runs on a worker thread so websockets and other jobs keep moving
+                await asyncio.to_thread(
+                    self.validator.apply_rules, df, column_rules, validation_tally, row_offset=row_count
+                )
+                
+                cleaned_df = await self.transformer.clean_dataframe(
+                    df, mappings, business_context
+                )
+                
+                # Save cleaned data
+                first_chunk = row_count == 0
+                await asyncio.to_thread(
+                    cleaned_df.to_csv,
+                    cleaned_file_path,
+                    mode="w" if first_chunk else "a",
+                    header=first_chunk,
+                    index=False
+                )
+                
+                data_changes += await asyncio.to_thread(self._count_changes, df, cleaned_df)
+                row_count += len(df)
+                
+                await self._update_job_status(
+                    job_id, ParseStatus.CLEANING, progress=70 + int(25 * fraction_read)
+                )
             
-            # Validate data
-            await self._update_job_status(job_id, ParseStatus.VALIDATING, progress=60)
+            if job_data is None:
+                raise ValueError("File contains no data")
             
-            validation_results = await self.validator.validate_dataframe(
-                df, mappings, business_context
-            )
+            validation_results = validation_tally.result(total_columns=job_data["column_count"])
             
+            job_data["row_count"] = row_count
             job_data["validation_results"] = validation_results
             job_data["metrics"]["validation_errors"] = len(validation_results.get("errors", []))
             
-            await self._update_job_data(job_id, job_data, progress=80)
-            
-            # Clean data
-            await self._update_job_status(job_id, ParseStatus.CLEANING, progress=90)
-            
-            cleaned_df = await self.transformer.clean_dataframe(
-                df, mappings, business_context
-            )
-            
-            # Save cleaned data
-            cleaned_file_path = Path(file_path).parent / f"{job_id}_cleaned.csv"
-            cleaned_df.to_csv(cleaned_file_path, index=False)
-            
             job_data["cleaned_file_path"] = str(cleaned_file_path)
-            job_data["metrics"]["data_changes"] = self._count_changes(df, cleaned_df)
+            job_data["metrics"]["data_changes"] = data_changes
             job_data["metrics"]["processing_end"] = datetime.utcnow().isoformat()
-            
-            # Calculate processing time
-            start_time = datetime.fromisoformat(job_data["metrics"]["processing_start"])
-            end_time = datetime.fromisoformat(job_data["metrics"]["processing_end"])
-            job_data["metrics"]["processing_time_seconds"] = (end_time - start_time).total_seconds()
+            job_data["metrics"]["processing_time_seconds"] = time.monotonic() - started
             
             # Estimate cost
             job_data["metrics"]["estimated_cost"] = gemini_client.estimate_cost(
                 job_data["metrics"]["llm_tokens_used"]
             )
             
-            await self._update_job_status(job_id, ParseStatus.COMPLETED, progress=100)
-            await self._update_job_data(job_id, job_data)
-            
+            # Results land in the same write that marks the job completed
+            await self._update_job_status(
+                job_id, ParseStatus.COMPLETED, progress=100,
+                fields={
+                    field: job_data[field]
+                    for field in ["row_count", "validation_results", "cleaned_file_path", "metrics"]
+                }
+            )
+        
         except Exception as e:
             logger.error("Failed to process file", job_id=job_id, error=str(e))
             await self._update_job_status(
@@ -148,7 +206,7 @@ class ParserService:
         rows: int = 10,
         sheet_name: Optional[Union[str, int]] = None
     ) -> Dict[str, Any]:
-        file_extension = filename.split(".")[-1].lower()
+        file_extension = os.path.splitext(filename)[1].lstrip(".").lower()
         
         if file_extension in ["xlsx", "xls"] and sheet_name is not None:
             # Preview specific Excel sheet
@@ -165,6 +223,19 @@ class ParserService:
                 "encoding": "utf-8"  # Can be detected if needed
             }
     
+    async def stream_preview(
+        self,
+        file_contents: bytes,
+        filename: str,
+        rows: int = 10
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield preview rows one at a time instead of building the whole payload"""
+        df = await self.file_handler.read_file_contents(file_contents, filename)
+        headers = df.columns.tolist()
+        
+        for values in df.head(rows).itertuples(index=False, name=None):
+            yield dict(zip(headers, values))
+    
     async def suggest_mappings(
         self,
         headers: List[str],
@@ -181,10 +252,7 @@ class ParserService:
         if not job_data:
             return False
         
-        job_data["user_mappings"] = mappings
-        job_data["updated_at"] = datetime.utcnow().isoformat()
-        
-        return await self._update_job_data(job_id, job_data)
+        return await self._update_job_data(job_id, {"user_mappings": mappings})
     
     async def validate_data(
         self,
@@ -226,7 +294,7 @@ class ParserService:
             custom_rules=cleaning_rules
         )
         
-        changes = self._analyze_changes(df, cleaned_df)
+        changes = await asyncio.to_thread(self._analyze_changes, df, cleaned_df)
         
         return {
             "data": cleaned_df.to_dict(orient="records"),
@@ -243,23 +311,72 @@ class ParserService:
         if not cleaned_file_path or not Path(cleaned_file_path).exists():
             return None
         
-        df = pd.read_csv(cleaned_file_path)
-        
         export_filename = f"{job_id}_export.{format}"
         export_path = Path(cleaned_file_path).parent / export_filename
         
-        if format == "csv":
-            df.to_csv(export_path, index=False)
-        elif format == "xlsx":
-            df.to_excel(export_path, index=False)
-        elif format == "json":
-            df.to_json(export_path, orient="records", indent=2)
+        # A rendered export is reused until the cleaned data is rewritten
+        if not export_path.exists() or export_path.stat().st_mtime < Path(cleaned_file_path).stat().st_mtime:
+            await asyncio.to_thread(self._render_export, Path(cleaned_file_path), export_path, format)
         
         return {
             "url": f"/uploads/{export_filename}",
-            "filename": export_filename
+            "filename": export_filename,
+            "path": str(export_path)
         }
     
+    def _render_export(self, cleaned_path: Path, export_path: Path, format: str):
+        export_path.unlink(missing_ok=True)
+        
+        if format == "csv":
+            # The cleaned data is already CSV; link it rather than parse and re-render it
+            try:
+                os.link(cleaned_path, export_path)
+            except OSError:
+                shutil.copyfile(cleaned_path, export_path)
+            return
+        
+        # Render beside the target and swap it in, so a failed export is never reused
+        partial_path = export_path.with_name(f"{export_path.name}.partial")
+        chunks = pd.read_csv(cleaned_path, chunksize=CSV_CHUNK_ROWS)
+        
+        if format == "xlsx":
+            self._write_xlsx(chunks, partial_path)
+        elif format == "json":
+            self._write_json(chunks, partial_path)
+        else:
+            return
+        
+        os.replace(partial_path, export_path)
+    
+    def _write_xlsx(self, chunks: Iterator[pd.DataFrame], path: Path):
+        # constant_memory flushes each row once written, so rows must go out in order
+        workbook = xlsxwriter.Workbook(str(path), {"constant_memory": True})
+        try:
+            worksheet = workbook.add_worksheet()
+            row = 0
+            for chunk in chunks:
+                if row == 0:
+                    worksheet.write_row(0, 0, chunk.columns.tolist())
+                    row = 1
+                
+                for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+                    worksheet.write_row(row, 0, values)
+                    row += 1
+        finally:
+            workbook.close()
+    
+    def _write_json(self, chunks: Iterator[pd.DataFrame], path: Path):
+        # One JSON array written a chunk at a time
+        with open(path, "w") as f:
+            f.write("[")
+            separator = ""
+            for chunk in chunks:
+                records = chunk.to_json(orient="records", indent=2)[1:-2]
+                if records:
+                    f.write(separator + records)
+                    separator = ","
+            f.write("\n]")
+    
     async def get_job_metrics(self, job_id: str) -> Optional[Dict[str, Any]]:
         job_data = await self._get_job_data(job_id)
         if not job_data:
@@ -268,26 +385,80 @@ class ParserService:
         return job_data.get("metrics", {})
     
     async def handle_websocket(self, websocket: WebSocket, job_id: str):
-        while True:
-            job_data = await self._get_job_data(job_id)
-            
-            if job_data:
-                await websocket.send_json({
-                    "type": "status_update",
-                    "data": {
-                        "status": job_data.get("status"),
-                        "progress": job_data.get("progress", 0),
-                        "message": self._get_status_message(job_data.get("status"))
-                    }
-                })
+        sender = BatchedWSSender(websocket)
+        sender.start()
+        last_update = None
+        
+        # Either of these finishing means the client is gone, even if no event ever arrives
+        disconnected = asyncio.create_task(self._wait_disconnect(websocket))
+        send_failed = asyncio.create_task(sender.closed.wait())
+        next_event = None
+        
+        try:
+            # Subscribe before reading the current state so no update falls in between
+            async with cache_manager.subscribe(self._job_events_channel(job_id)) as events:
+                job_data = await cache_manager.hmget(self._job_key(job_id), ["status", "progress"])
+                update = self._status_update(job_data) if job_data else None
                 
-                if job_data.get("status") in [ParseStatus.COMPLETED, ParseStatus.FAILED]:
-                    break
-            
-            await asyncio.sleep(1)
+                while True:
+                    # Only push progress that actually changed since the last update
+                    if update and update != last_update:
+                        sender.send({"type": "status_update", "data": update})
+                        last_update = update
+                    
+                    if update and update["status"] in [ParseStatus.COMPLETED, ParseStatus.FAILED]:
+                        break
+                    
+                    if next_event is None:
+                        next_event = asyncio.create_task(events.get())
+                    done, _ = await asyncio.wait(
+                        {next_event, disconnected, send_failed},
+                        timeout=WS_STATUS_REFRESH_SECONDS,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    
+                    if disconnected in done or send_failed in done:
+                        break
+                    
+                    if next_event in done:
+                        update = next_event.result()
+                        next_event = None
+                    else:
+                        # Events can be lost (Redis down, a crashed worker), so fall back to the job hash
+                        job_data = await cache_manager.hmget(self._job_key(job_id), ["status", "progress"])
+                        update = self._status_update(job_data) if job_data else None
+        finally:
+            for task in (next_event, disconnected, send_failed):
+                if task is not None:
+                    task.cancel()
+            await sender.close()
+    
+    async def _wait_disconnect(self, websocket: WebSocket):
+        # Clients have nothing to say on this socket; only the disconnect matters
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+        except Exception:
+            # A socket that can no longer be read from is as good as disconnected
+            return
+    
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.job_cache_prefix}:{job_id}"
+    
+    def _job_events_channel(self, job_id: str) -> str:
+        return f"{self.job_cache_prefix}:{job_id}:events"
+    
+    def _status_update(self, job_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": job_data.get("status"),
+            "progress": job_data.get("progress", 0),
+            "message": self._get_status_message(job_data.get("status"))
+        }
     
     async def _get_job_data(self, job_id: str) -> Optional[Dict[str, Any]]:
-        return await cache_manager.get(f"{self.job_cache_prefix}:{job_id}")
+        return await cache_manager.hgetall(self._job_key(job_id))
     
     async def _update_job_data(
         self,
@@ -295,29 +466,35 @@ class ParserService:
         job_data: Dict[str, Any],
         progress: Optional[int] = None
     ) -> bool:
+        # Only the fields in job_data are written; the rest of the job hash is left as is
         if progress is not None:
             job_data["progress"] = progress
         
         job_data["updated_at"] = datetime.utcnow().isoformat()
-        return await cache_manager.set(f"{self.job_cache_prefix}:{job_id}", job_data)
+        return await cache_manager.hset(self._job_key(job_id), job_data)
     
     async def _update_job_status(
         self,
         job_id: str,
         status: ParseStatus,
         progress: Optional[int] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        fields: Optional[Dict[str, Any]] = None
     ):
-        job_data = await self._get_job_data(job_id)
+        # fields are extra job data written in the same update as the status
+        job_data = await cache_manager.hmget(self._job_key(job_id), ["job_id", "progress", "errors"])
         if job_data:
-            job_data["status"] = status
+            updates = dict(fields or {})
+            updates["status"] = status
             if progress is not None:
-                job_data["progress"] = progress
+                updates["progress"] = progress
             if error:
-                job_data["error"] = error
-                job_data["errors"] = job_data.get("errors", []) + [error]
+                updates["error"] = error
+                updates["errors"] = job_data.get("errors", []) + [error]
             
-            await self._update_job_data(job_id, job_data)
+            await self._update_job_data(job_id, updates)
+            job_data.update(updates)
+            await cache_manager.publish(self._job_events_channel(job_id), self._status_update(job_data))
     
     def _generate_default_schema(self, headers: List[str]) -> Dict[str, str]:
         # Simple default schema generation
@@ -329,11 +506,8 @@ class ParserService:
         return schema
     
     def _count_changes(self, original_df: pd.DataFrame, cleaned_df: pd.DataFrame) -> int:
-        changes = 0
-        for col in original_df.columns:
-            if col in cleaned_df.columns:
-                changes += (original_df[col] != cleaned_df[col]).sum()
-        return int(changes)
+        cols = original_df.columns.intersection(cleaned_df.columns)
+        return int((original_df[cols] != cleaned_df[cols]).to_numpy().sum())
     
     def _analyze_changes(self, original_df: pd.DataFrame, cleaned_df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
         changes = {}
@@ -343,21 +517,23 @@ class ParserService:
                 col_changes = {}
                 
                 # Count different types of changes
-                modified = (original_df[col] != cleaned_df[col]).sum()
+                modified_mask = (original_df[col] != cleaned_df[col]).to_numpy()
+                modified = int(modified_mask.sum())
                 
                 if modified > 0:
-                    col_changes["modified"] = int(modified)
+                    col_changes["modified"] = modified
                     
-                    # Analyze specific changes
-                    for idx in range(len(original_df)):
-                        if original_df[col].iloc[idx] != cleaned_df[col].iloc[idx]:
-                            original_val = str(original_df[col].iloc[idx])
-                            cleaned_val = str(cleaned_df[col].iloc[idx])
-                            
-                            if original_val.strip() != original_val:
-                                col_changes["trimmed"] = col_changes.get("trimmed", 0) + 1
-                            if original_val.lower() == cleaned_val:
-                                col_changes["case_changed"] = col_changes.get("case_changed", 0) + 1
+                    # Analyze specific changes on the modified cells only, as strings
+                    original_vals = original_df[col].to_numpy(dtype=object)[modified_mask].astype(str)
+                    cleaned_vals = cleaned_df[col].to_numpy(dtype=object)[modified_mask].astype(str)
+                    
+                    trimmed = int((np.char.strip(original_vals) != original_vals).sum())
+                    case_changed = int((np.char.lower(original_vals) == cleaned_vals).sum())
+                    
+                    if trimmed:
+                        col_changes["trimmed"] = trimmed
+                    if case_changed:
+                        col_changes["case_changed"] = case_changed
                 
                 if col_changes:
                     changes[col] = col_changes
@@ -365,17 +541,7 @@ class ParserService:
         return changes
     
     def _get_status_message(self, status: Optional[str]) -> str:
-        messages = {
-            ParseStatus.PENDING: "Job is queued for processing",
-            ParseStatus.PROCESSING: "Reading and analyzing file",
-            ParseStatus.MAPPING: "Generating intelligent column mappings",
-            ParseStatus.VALIDATING: "Validating data integrity",
-            ParseStatus.CLEANING: "Cleaning and standardizing data",
-            ParseStatus.COMPLETED: "Processing completed successfully",
-            ParseStatus.FAILED: "Processing failed"
-        }
-        
-        return messages.get(status, "Unknown status")
+        return _STATUS_MESSAGES.get(status, "Unknown status")
     
     async def get_excel_sheets_info(self, file_contents: bytes, filename: str) -> List[Dict[str, Any]]:
         """Get information about all sheets in an Excel file"""
@@ -474,7 +640,13 @@ class ParserService:
             }
             
             return response
-            
+        
         except Exception as e:
             logger.error(f"Error extracting JSON from Excel: {e}")
-            raise
\ No newline at end of file
+            raise
+
+
+@lru_cache(maxsize=1)
+def get_parser_service() -> ParserService:
+    """Process-wide ParserService; repeated imports of the routes share one instance"""
+    return ParserService()
\ No newline at end of file
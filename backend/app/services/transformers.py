@@ -1,17 +1,33 @@
 import re
+import asyncio
+import hashlib
 from typing import Dict, List, Any, Optional
 import pandas as pd
 import structlog
 
+from app.core.cache import cache_manager
+from app.core.config import settings
 from app.core.llm_client import gemini_client
 from app.models.enums import CleaningActionType
+from app.utils.concurrency import gather_bounded
 
 logger = structlog.get_logger()
 
+LLM_CLEAN_BATCH_SIZE = 32
+LLM_CLEAN_CACHE_TTL = 86400 * 7
+
 
 class DataTransformer:
     def __init__(self):
         self.special_chars_pattern = re.compile(r'[^\w\s-]')
+        self.whitespace_pattern = re.compile(r'\s+')
+        self.non_numeric_pattern = re.compile(r'[^\d.-]+')
+        # Fixed character sets are cheaper to drop with a translate table than a regex
+        self.currency_symbols_table = str.maketrans('', '', '$,€£¥')
+        self.non_phone_pattern = re.compile(r'[^\d+\-()]')
+        self.name_suffix_pattern = re.compile(r'jr|sr|iii|ii', re.IGNORECASE)
+        self.address_abbreviation_pattern = re.compile(r'st\.|ave\.|rd\.|blvd\.|apt|ste', re.IGNORECASE)
+        self.email_typo_pattern = re.compile(r'gmial|yaho|hotmial|outlok', re.IGNORECASE)
     
     async def clean_dataframe(
         self,
@@ -20,139 +36,215 @@ class DataTransformer:
         business_context: str,
         custom_rules: Optional[List[Dict]] = None
     ) -> pd.DataFrame:
-        cleaned_df = df.copy()
-        
-        for column, mapping in mappings.items():
-            if column not in cleaned_df.columns:
-                continue
-            
-            field_type = mapping.get("data_type", "string")
-            
-            # Apply basic cleaning first
-            cleaned_df[column] = cleaned_df[column].apply(
-                lambda x: self._basic_clean(x, field_type)
+        # Columns are independent, so their LLM round-trips overlap instead of queueing
+        cleaned_columns = await asyncio.gather(*(
+            self._clean_one_column(
+                df[column],
+                mapping.get("data_type", "string"),
+                business_context,
+                custom_rules
             )
+            for column, mapping in mappings.items()
+            if column in df.columns
+        ))
+        cleaned_by_name = {cleaned_column.name: cleaned_column for cleaned_column in cleaned_columns}
+        
+        # Untouched columns are carried over by reference instead of copying the whole frame
+        return pd.DataFrame(
+            {column: cleaned_by_name.get(column, df[column]) for column in df.columns},
+            index=df.index,
+            copy=False
+        )
+    
+    async def _clean_one_column(
+        self,
+        series: pd.Series,
+        field_type: str,
+        business_context: str,
+        custom_rules: Optional[List[Dict]] = None
+    ) -> pd.Series:
+        column = series.name
+        
+        # Apply basic cleaning first, off the event loop
+        series = await asyncio.to_thread(self._clean_column, series, field_type)
+        
+        # Apply LLM-powered cleaning for complex cases
+        if field_type in ["name", "address", "email"]:
+            # Each distinct dirty value is cleaned once and broadcast to every row holding it
+            unique_values = pd.Series(series.dropna().unique(), dtype=object)
+            candidates = unique_values[self._needs_llm_cleaning(unique_values, field_type)].tolist()
             
-            # Apply LLM-powered cleaning for complex cases
-            if field_type in ["name", "address", "email"]:
-                sample_values = cleaned_df[column].dropna().head(5).tolist()
+            if candidates:
+                replacements = await self._llm_clean_values(
+                    values=[str(value) for value in candidates],
+                    field_name=column,
+                    field_type=field_type,
+                    business_context=business_context
+                )
                 
-                if sample_values:
-                    # Process in batches for efficiency
-                    for idx, value in enumerate(cleaned_df[column]):
-                        if pd.notna(value) and self._needs_llm_cleaning(value, field_type):
-                            cleaned_value = await self._llm_clean(
-                                value=str(value),
-                                field_name=column,
-                                field_type=field_type,
-                                context={"business_context": business_context}
-                            )
-                            
-                            if cleaned_value and cleaned_value != value:
-                                cleaned_df.at[idx, column] = cleaned_value
-            
-            # Apply custom rules if provided
-            if custom_rules:
-                for rule in custom_rules:
-                    if rule.get("field_name") == column:
-                        cleaned_df[column] = self._apply_cleaning_rule(
-                            cleaned_df[column], rule
-                        )
-        
-        return cleaned_df
+                changed = series.isin(list(replacements))
+                if changed.any():
+                    series.loc[changed] = series[changed].map(replacements)
+        
+        # Apply custom rules if provided
+        if custom_rules:
+            for rule in custom_rules:
+                if rule.get("field_name") == column:
+                    series = self._apply_cleaning_rule(series, rule)
+        
+        return series
     
-    def _basic_clean(self, value: Any, field_type: str) -> Any:
-        if pd.isna(value):
-            return value
+    def _clean_column(self, series: pd.Series, field_type: str) -> pd.Series:
+        # Whole-column string ops; missing values pass through untouched
+        present = series.notna()
+        if not present.any():
+            return series
         
-        value_str = str(value).strip()
+        original = series[present]
+        values = original.astype(str).str.strip()
         
         if field_type == "string":
             # Remove extra whitespace
-            value_str = " ".join(value_str.split())
+            values = values.str.replace(self.whitespace_pattern, " ", regex=True)
         
         elif field_type == "number":
             # Remove non-numeric characters except decimal point
-            value_str = re.sub(r'[^\d.-]', '', value_str)
-            try:
-                return float(value_str)
-            except ValueError:
-                return value
+            values = self._to_float(
+                values.str.replace(self.non_numeric_pattern, "", regex=True),
+                original
+            )
         
         elif field_type == "currency":
             # Remove currency symbols and convert to float
-            value_str = re.sub(r'[$,€£¥]', '', value_str).strip()
-            try:
-                return float(value_str)
-            except ValueError:
-                return value
+            values = self._to_float(
+                values.str.translate(self.currency_symbols_table).str.strip(),
+                original
+            )
         
         elif field_type == "percentage":
             # Remove % and convert to decimal
-            value_str = value_str.replace('%', '').strip()
-            try:
-                return float(value_str) / 100
-            except ValueError:
-                return value
+            numeric = pd.to_numeric(
+                values.str.replace("%", "", regex=False).str.strip(),
+                errors="coerce"
+            ).astype(float)
+            values = (numeric / 100).where(numeric.notna(), original)
         
         elif field_type == "phone":
             # Basic phone number cleaning
-            value_str = re.sub(r'[^\d+\-()]', '', value_str)
+            values = values.str.replace(self.non_phone_pattern, "", regex=True)
         
         elif field_type == "email":
             # Lowercase and remove spaces
-            value_str = value_str.lower().replace(' ', '')
+            values = values.str.lower().str.replace(" ", "", regex=False)
         
-        return value_str
+        return values.reindex(series.index).where(present, series)
+    
+    def _to_float(self, values: pd.Series, original: pd.Series) -> pd.Series:
+        # Unparseable values keep their original form
+        numeric = pd.to_numeric(values, errors="coerce").astype(float)
+        return numeric.where(numeric.notna(), original)
     
-    def _needs_llm_cleaning(self, value: str, field_type: str) -> bool:
+    def _needs_llm_cleaning(self, values: pd.Series, field_type: str) -> pd.Series:
+        # Boolean mask over values, one regex pass per check instead of a Python loop
         if field_type == "name":
-            # Check for inconsistent capitalization, abbreviations
+            # Inconsistent capitalization, suffixes, or a single name that might need expansion
             return (
-                value.isupper() or
-                value.islower() or
-                any(word in value.lower() for word in ["jr", "sr", "iii", "ii"]) or
-                len(value.split()) == 1  # Single name that might need expansion
-            )
+                values.str.isupper() |
+                values.str.islower() |
+                values.str.contains(self.name_suffix_pattern) |
+                (values.str.split().str.len() == 1)
+            ).fillna(False).astype(bool)
         
         elif field_type == "address":
             # Check for abbreviations, inconsistent formatting
-            return any(
-                abbr in value.lower()
-                for abbr in ["st.", "ave.", "rd.", "blvd.", "apt", "ste"]
-            )
+            return values.str.contains(self.address_abbreviation_pattern).fillna(False).astype(bool)
         
         elif field_type == "email":
             # Check for obvious typos in domain
-            return any(
-                typo in value.lower()
-                for typo in ["gmial", "yaho", "hotmial", "outlok"]
-            )
+            return values.str.contains(self.email_typo_pattern).fillna(False).astype(bool)
         
-        return False
+        return pd.Series(False, index=values.index)
     
-    async def _llm_clean(
+    async def _llm_clean_values(
         self,
-        value: str,
+        values: List[str],
+        field_name: str,
+        field_type: str,
+        business_context: str
+    ) -> Dict[str, str]:
+        # Results are remembered per (context, field type, value), so later jobs skip the LLM
+        keys = {value: self._clean_cache_key(business_context, field_type, value) for value in values}
+        cached = await cache_manager.mget(list(keys.values()), local_cacheable=True)
+        results = {value: hit for value, hit in zip(keys, cached) if hit is not None}
+        
+        # Clean the rest in batches, one prompt per batch, sent concurrently
+        pending = [value for value in keys if value not in results]
+        batches = [
+            pending[start:start + LLM_CLEAN_BATCH_SIZE]
+            for start in range(0, len(pending), LLM_CLEAN_BATCH_SIZE)
+        ]
+        cleaned_batches = await gather_bounded(
+            (
+                self._llm_clean_batch(
+                    values=batch,
+                    field_name=field_name,
+                    field_type=field_type,
+                    context={"business_context": business_context}
+                )
+                for batch in batches
+            ),
+            settings.GEMINI_MAX_CONCURRENCY
+        )
+        
+        cache_writes = []
+        for batch, cleaned_values in zip(batches, cleaned_batches):
+            for value, cleaned_value in zip(batch, cleaned_values):
+                if cleaned_value is not None:
+                    results[value] = cleaned_value
+                    cache_writes.append((keys[value], cleaned_value, LLM_CLEAN_CACHE_TTL))
+        await cache_manager.mset(cache_writes)
+        
+        return {
+            value: cleaned_value
+            for value, cleaned_value in results.items()
+            if cleaned_value and cleaned_value != value
+        }
+    
+    def _clean_cache_key(self, context: str, field_type: str, value: str) -> str:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+        return f"clean:{context}:{field_type}:{digest}"
+    
+    async def _llm_clean_batch(
+        self,
+        values: List[str],
         field_name: str,
         field_type: str,
         context: Dict[str, Any]
-    ) -> Optional[str]:
+    ) -> List[Optional[str]]:
+        # None marks values the model gave no usable answer for; those are not cached
         try:
-            result = await gemini_client.clean_value(
-                value=value,
+            results = await gemini_client.clean_values_batch(
+                values=values,
                 field_name=field_name,
                 field_type=field_type,
                 context=context
             )
             
-            if result.get("confidence", 0) > 0.7:
-                return result.get("cleaned_value", value)
-            
+            cleaned_values = []
+            for value, result in zip(values, results):
+                confidence = result.get("confidence", 0)
+                if not confidence:
+                    cleaned_values.append(None)
+                elif confidence > 0.7:
+                    cleaned_values.append(result.get("cleaned_value", value))
+                else:
+                    cleaned_values.append(value)
+            return cleaned_values
+        
         except Exception as e:
             logger.error("LLM cleaning error", error=str(e))
         
-        return value
+        return [None] * len(values)
     
     def _apply_cleaning_rule(self, series: pd.Series, rule: Dict[str, Any]) -> pd.Series:
         action_type = rule.get("action_type")
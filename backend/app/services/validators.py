@@ -1,14 +1,43 @@
 import re
+import asyncio
+import hashlib
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+import orjson
+import numpy as np
 import pandas as pd
 import structlog
 
+from app.core.cache import cache_manager
+from app.core.config import settings
 from app.core.llm_client import gemini_client
 from app.models.enums import ValidationRuleType, ValidationSeverity
+from app.utils.concurrency import gather_bounded
 
 logger = structlog.get_logger()
 
+# Only the first few results of each kind are returned; counts cover all of them
+MAX_REPORTED_ERRORS = 100
+MAX_REPORTED_WARNINGS = 50
+MAX_REPORTED_INFO = 20
+
+RULES_CACHE_TTL = 3600
+
+# Rule types that test the string form of each value
+_TEXT_RULE_TYPES = {
+    ValidationRuleType.REQUIRED,
+    ValidationRuleType.PATTERN,
+    ValidationRuleType.LENGTH,
+    ValidationRuleType.FORMAT
+}
+
+
+@lru_cache(maxsize=256)
+def _compile_pattern(pattern: str) -> re.Pattern:
+    # Rule patterns repeat across columns, chunks and jobs; compile each one once
+    return re.compile(pattern)
+
 
 class DataValidator:
     def __init__(self):
@@ -25,81 +54,299 @@ class DataValidator:
         business_context: str,
         custom_rules: Optional[List[Dict]] = None
     ) -> Dict[str, Any]:
-        errors = []
-        warnings = []
-        info = []
+        column_rules = await self.generate_rules(df, mappings, business_context)
+        
+        tally = ValidationTally()
+        await asyncio.to_thread(self.apply_rules, df, column_rules, tally, custom_rules=custom_rules)
         
-        # Generate validation rules using LLM
+        return tally.result(total_columns=len(df.columns))
+    
+    async def generate_rules(
+        self,
+        df: pd.DataFrame,
+        mappings: Dict[str, Dict[str, Any]],
+        business_context: str
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        # Generate validation rules using LLM, one concurrent request per column
+        columns = []
+        samples = []
         for column, mapping in mappings.items():
             if column not in df.columns:
                 continue
             
             # Get sample values
-            sample_values = df[column].dropna().head(10).tolist()
+            sample_values = self._sample_values(df[column])
             
             if not sample_values:
                 continue
             
-            # Generate rules with LLM
-            rules = await gemini_client.generate_validation_rules(
-                field_name=column,
-                field_type=mapping.get("data_type", "string"),
-                sample_values=sample_values,
-                business_context=business_context
-            )
+            columns.append(column)
+            samples.append(sample_values)
+        
+        # Columns with the same name, type and samples in this context reuse earlier rules
+        keys = [
+            self._rules_cache_key(business_context, column, mappings[column].get("data_type", "string"), sample_values)
+            for column, sample_values in zip(columns, samples)
+        ]
+        cached = await cache_manager.mget(keys, local_cacheable=True)
+        column_rules = {column: rules for column, rules in zip(columns, cached) if rules is not None}
+        
+        pending = [idx for idx, column in enumerate(columns) if column not in column_rules]
+        generated = await gather_bounded(
+            (
+                gemini_client.generate_validation_rules(
+                    field_name=columns[idx],
+                    field_type=mappings[columns[idx]].get("data_type", "string"),
+                    sample_values=samples[idx],
+                    business_context=business_context
+                )
+                for idx in pending
+            ),
+            settings.GEMINI_MAX_CONCURRENCY
+        )
+        logger.debug("Validation rules cache", hits=len(column_rules), misses=len(pending))
+        
+        cache_writes = []
+        for idx, rules in zip(pending, generated):
+            column_rules[columns[idx]] = rules
+            # An empty list may be a parse failure; leave it to the LLM client's short negative cache
+            if rules:
+                cache_writes.append((keys[idx], rules, RULES_CACHE_TTL))
+        await cache_manager.mset(cache_writes)
+        
+        return {column: column_rules[column] for column in columns}
+    
+    def _sample_values(self, series: pd.Series, count: int = 10, window: int = 200) -> List[Any]:
+        # The first non-null values usually sit near the top; only scan the whole column when they don't
+        sample = series.head(window).dropna()
+        if len(sample) < count and len(series) > window:
+            sample = series.dropna()
+        return sample.head(count).tolist()
+    
+    def _rules_cache_key(self, context: str, column: str, field_type: str, sample_values: List[Any]) -> str:
+        # Sample order does not change the rules, so it does not change the key either
+        key_data = orjson.dumps([column, field_type, sorted(str(value) for value in sample_values)])
+        return f"rules:{context}:{hashlib.blake2b(key_data, digest_size=16).hexdigest()}"
+    
+    def apply_rules(
+        self,
+        df: pd.DataFrame,
+        column_rules: Dict[str, List[Dict[str, Any]]],
+        tally: "ValidationTally",
+        custom_rules: Optional[List[Dict]] = None,
+        row_offset: int = 0
+    ):
+        # row_offset makes row indexes file-global when df is one chunk of a larger file
+        for column, rules in column_rules.items():
+            if column not in df.columns:
+                continue
             
-            # Apply rules
-            for idx, value in enumerate(df[column]):
-                for rule in rules:
-                    validation_result = self._apply_rule(
-                        value=value,
-                        rule=rule,
-                        row_index=idx,
-                        column=column
-                    )
-                    
-                    if validation_result:
-                        if rule.get("severity") == ValidationSeverity.ERROR:
-                            errors.append(validation_result)
-                        elif rule.get("severity") == ValidationSeverity.WARNING:
-                            warnings.append(validation_result)
-                        else:
-                            info.append(validation_result)
+            # Apply rules a whole column at a time
+            series = df[column]
+            has_unique = any(rule.get("rule_type") == ValidationRuleType.UNIQUE for rule in rules)
+            seen = tally.unique_values.setdefault(column, set()) if has_unique else None
+            # One string cast per column, shared by every rule that needs it
+            text = series.astype(str) if any(rule.get("rule_type") in _TEXT_RULE_TYPES for rule in rules) else None
+            masks = [self._apply_rule_vectorized(series, rule, seen, text) for rule in rules]
+            severities = [self._severity(rule) for rule in rules]
+            
+            for severity in ValidationSeverity:
+                picked = [idx for idx, rule_severity in enumerate(severities) if rule_severity == severity]
+                if not picked:
+                    continue
+                self._record_failures(
+                    series, column,
+                    [rules[idx] for idx in picked],
+                    [masks[idx] for idx in picked],
+                    severity, tally, row_offset
+                )
+            
+            if seen is not None:
+                try:
+                    seen.update(series.dropna())
+                except TypeError:
+                    # Unhashable values (lists, dicts from JSON payloads) are never checked for uniqueness
+                    pass
         
         # Apply custom rules if provided
         if custom_rules:
             for rule in custom_rules:
                 column = rule.get("field_name")
                 if column in df.columns:
-                    for idx, value in enumerate(df[column]):
-                        validation_result = self._apply_rule(
-                            value=value,
-                            rule=rule,
-                            row_index=idx,
-                            column=column
-                        )
-                        
-                        if validation_result:
-                            errors.append(validation_result)
+                    series = df[column]
+                    self._record_failures(
+                        series, column,
+                        [rule],
+                        [self._apply_rule_vectorized(series, rule)],
+                        ValidationSeverity.ERROR, tally, row_offset
+                    )
         
-        # Summary statistics
-        summary = {
-            "total_rows": len(df),
-            "total_columns": len(df.columns),
-            "errors_count": len(errors),
-            "warnings_count": len(warnings),
-            "info_count": len(info),
-            "error_columns": list(set(e["column"] for e in errors)),
-            "warning_columns": list(set(w["column"] for w in warnings))
-        }
+        tally.total_rows += len(df)
+    
+    def _severity(self, rule: Dict[str, Any]) -> ValidationSeverity:
+        if rule.get("severity") == ValidationSeverity.ERROR:
+            return ValidationSeverity.ERROR
+        elif rule.get("severity") == ValidationSeverity.WARNING:
+            return ValidationSeverity.WARNING
+        return ValidationSeverity.INFO
+    
+    def _record_failures(
+        self,
+        series: pd.Series,
+        column: str,
+        rules: List[Dict[str, Any]],
+        masks: List[np.ndarray],
+        severity: ValidationSeverity,
+        tally: "ValidationTally",
+        row_offset: int
+    ):
+        positions = [np.flatnonzero(mask) for mask in masks]
+        count = sum(len(rows) for rows in positions)
+        if not count:
+            return
         
-        return {
-            "valid": len(errors) == 0,
-            "errors": errors[:100],  # Limit to first 100 errors
-            "warnings": warnings[:50],  # Limit to first 50 warnings
-            "info": info[:20],  # Limit to first 20 info messages
-            "summary": summary
-        }
+        # Only the failures that will be reported become dicts, taken in row order, then
+        # rule order, exactly as a row-by-row scan would have produced them
+        reported = []
+        room = tally.room(severity)
+        if room:
+            rows = np.concatenate(positions)
+            rule_ids = np.concatenate([np.full(len(idx), rule_id) for rule_id, idx in enumerate(positions)])
+            order = np.lexsort((rule_ids, rows))[:room]
+            values = series.iloc[rows[order]].tolist()
+            
+            for row, rule_id, value in zip(rows[order], rule_ids[order], values):
+                validation_result = self._failure_result(
+                    value=value,
+                    rule=rules[rule_id],
+                    row_index=row_offset + int(row),
+                    column=column
+                )
+                if validation_result:
+                    reported.append(validation_result)
+        
+        tally.add_failures(severity, column, count, reported)
+    
+    def _failure_result(
+        self,
+        value: Any,
+        rule: Dict[str, Any],
+        row_index: int,
+        column: str
+    ) -> Optional[Dict[str, Any]]:
+        # Uniqueness cannot be judged from one value; the column mask already decided it
+        if rule.get("rule_type") == ValidationRuleType.UNIQUE:
+            return self._create_error(
+                row_index, column, value, rule,
+                rule.get("error_message", f"{column} must be unique")
+            )
+        
+        return self._apply_rule(value=value, rule=rule, row_index=row_index, column=column)
+    
+    def _apply_rule_vectorized(
+        self,
+        series: pd.Series,
+        rule: Dict[str, Any],
+        seen: Optional[set] = None,
+        text: Optional[pd.Series] = None
+    ) -> np.ndarray:
+        """Boolean mask of the values in series that fail rule; text is series.astype(str) if already built"""
+        rule_type = rule.get("rule_type")
+        parameters = rule.get("parameters", {})
+        
+        try:
+            if text is None and rule_type in _TEXT_RULE_TYPES:
+                text = series.astype(str)
+            
+            if rule_type == ValidationRuleType.REQUIRED:
+                failed = series.isna() | text.str.strip().eq("")
+            
+            elif rule_type == ValidationRuleType.PATTERN:
+                pattern = parameters.get("pattern")
+                if not pattern:
+                    return np.zeros(len(series), dtype=bool)
+                failed = ~text.str.match(_compile_pattern(pattern))
+            
+            elif rule_type == ValidationRuleType.RANGE:
+                min_val = parameters.get("min")
+                max_val = parameters.get("max")
+                
+                numeric = pd.to_numeric(series, errors="coerce")
+                failed = pd.Series(False, index=series.index)
+                if min_val is not None:
+                    failed |= numeric < min_val
+                if max_val is not None:
+                    failed |= numeric > max_val
+                
+                # Missing and unparseable values keep the exact per-value semantics
+                unparsed = numeric.isna().to_numpy()
+                if unparsed.any():
+                    failed[unparsed] = self._apply_rule_per_value(series[unparsed], rule)
+            
+            elif rule_type == ValidationRuleType.LENGTH:
+                min_length = parameters.get("min")
+                max_length = parameters.get("max")
+                
+                lengths = text.str.len()
+                failed = pd.Series(False, index=series.index)
+                if min_length is not None:
+                    failed |= lengths < min_length
+                if max_length is not None:
+                    failed |= lengths > max_length
+            
+            elif rule_type == ValidationRuleType.FORMAT:
+                format_type = parameters.get("type")
+                
+                if format_type == "email":
+                    failed = ~text.str.match(self.email_pattern)
+                
+                elif format_type == "phone":
+                    digits = text.str.replace("-", "", regex=False).str.replace(" ", "", regex=False)
+                    failed = ~digits.str.match(self.phone_pattern)
+                
+                elif format_type == "url":
+                    failed = ~text.str.match(self.url_pattern)
+                
+                elif format_type == "date":
+                    date_format = parameters.get("format", "%Y-%m-%d")
+                    if not isinstance(date_format, str) or date_format in ["ISO8601", "mixed"]:
+                        # pandas reads these as parsing modes, not strptime formats
+                        return self._apply_rule_per_value(series, rule)
+                    
+                    parsed = pd.to_datetime(text, format=date_format, errors="coerce")
+                    failed = parsed.isna()
+                    
+                    # pandas cannot hold dates outside roughly 1677-2262; strptime has the final say
+                    unparsed = (failed & series.notna()).to_numpy()
+                    if unparsed.any():
+                        failed[unparsed] = self._apply_rule_per_value(series[unparsed], rule)
+                
+                else:
+                    return np.zeros(len(series), dtype=bool)
+            
+            elif rule_type == ValidationRuleType.UNIQUE:
+                # Every repeat fails, but not the first occurrence; seen holds earlier chunks' values
+                present = series.notna()
+                failed = series.duplicated() & present
+                if seen:
+                    failed |= series.map(seen.__contains__).astype(bool) & present
+            
+            else:
+                # CUSTOM and unknown rule types never fail here
+                return np.zeros(len(series), dtype=bool)
+            
+            return failed.to_numpy(dtype=bool)
+        
+        except Exception:
+            # Anything the column-wide path cannot handle gets the per-value treatment
+            return self._apply_rule_per_value(series, rule)
+    
+    def _apply_rule_per_value(self, series: pd.Series, rule: Dict[str, Any]) -> np.ndarray:
+        return np.fromiter(
+            (self._apply_rule(value, rule, 0, series.name) is not None for value in series),
+            dtype=bool,
+            count=len(series)
+        )
     
     def _apply_rule(
         self,
@@ -121,7 +368,7 @@ class DataValidator:
             
             elif rule_type == ValidationRuleType.PATTERN:
                 pattern = parameters.get("pattern")
-                if pattern and not re.match(pattern, str(value)):
+                if pattern and not _compile_pattern(pattern).match(str(value)):
                     return self._create_error(
                         row_index, column, value, rule,
                         rule.get("error_message", f"{column} does not match expected pattern")
@@ -199,8 +446,7 @@ class DataValidator:
                         )
             
             elif rule_type == ValidationRuleType.UNIQUE:
-                # This would need access to all values in the column
-                # Implement in the calling function
+                # Needs the whole column; see _apply_rule_vectorized
                 pass
             
             elif rule_type == ValidationRuleType.CUSTOM:
@@ -226,4 +472,72 @@ class DataValidator:
             "value": value,
             "rule": rule,
             "message": message
+        }
+
+
+class ValidationTally:
+    """Running validation results that keep only the reported head of each list"""
+    
+    def __init__(self):
+        self.errors: List[Dict[str, Any]] = []
+        self.warnings: List[Dict[str, Any]] = []
+        self.info: List[Dict[str, Any]] = []
+        self.errors_count = 0
+        self.warnings_count = 0
+        self.info_count = 0
+        self.error_columns = set()
+        # Values already seen per column, so UNIQUE rules hold across chunks
+        self.unique_values: Dict[str, set] = {}
+        self.warning_columns = set()
+        self.total_rows = 0
+    
+    def room(self, severity: ValidationSeverity) -> int:
+        reported, limit = self._reported(severity)
+        return max(limit - len(reported), 0)
+    
+    def add_failures(
+        self,
+        severity: ValidationSeverity,
+        column: str,
+        count: int,
+        reported: List[Dict[str, Any]]
+    ):
+        # count covers every failure; reported holds just the ones to keep
+        if severity == ValidationSeverity.ERROR:
+            self.errors_count += count
+            self.error_columns.add(column)
+        elif severity == ValidationSeverity.WARNING:
+            self.warnings_count += count
+            self.warning_columns.add(column)
+        else:
+            self.info_count += count
+        
+        kept, _ = self._reported(severity)
+        kept.extend(reported[:self.room(severity)])
+    
+    def _reported(self, severity: ValidationSeverity):
+        if severity == ValidationSeverity.ERROR:
+            return self.errors, MAX_REPORTED_ERRORS
+        elif severity == ValidationSeverity.WARNING:
+            return self.warnings, MAX_REPORTED_WARNINGS
+        return self.info, MAX_REPORTED_INFO
+    
+    def result(self, total_columns: int) -> Dict[str, Any]:
+        # Summary statistics
+        summary = {
+            "total_rows": self.total_rows,
+            "total_columns": total_columns,
+            "errors_count": self.errors_count,
+            "warnings_count": self.warnings_count,
+            "info_count": self.info_count,
+            "error_columns": list(self.error_columns),
+            "warning_columns": list(self.warning_columns)
+        }
+        
+        return {
+            "valid": self.errors_count == 0,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "info": self.info,
+            "summary": summary
         }
\ No newline at end of file
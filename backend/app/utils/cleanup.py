@@ -0,0 +1,48 @@
+import os
+import asyncio
+from pathlib import Path
+from typing import Optional, Union
+import structlog
+
+logger = structlog.get_logger()
+
+_cleanup_queue: asyncio.Queue = asyncio.Queue()
+_cleanup_task: Optional[asyncio.Task] = None
+
+
+def _remove_file(path: Path):
+    if path.exists():
+        os.unlink(path)
+
+
+async def _cleanup_worker():
+    while True:
+        path = await _cleanup_queue.get()
+        try:
+            await asyncio.to_thread(_remove_file, Path(path))
+        except OSError as e:
+            logger.error("Failed to remove file", path=str(path), error=str(e))
+        finally:
+            _cleanup_queue.task_done()
+
+
+def schedule_removal(path: Union[str, Path]):
+    """Queue a file for deletion off the request path"""
+    _cleanup_queue.put_nowait(path)
+
+
+def start_cleanup_worker():
+    global _cleanup_task
+    if _cleanup_task is None:
+        _cleanup_task = asyncio.create_task(_cleanup_worker())
+
+
+async def stop_cleanup_worker():
+    global _cleanup_task
+    if _cleanup_task is None:
+        return
+    
+    # Finish pending deletions before shutting down
+    await _cleanup_queue.join()
+    _cleanup_task.cancel()
+    _cleanup_task = None
@@ -0,0 +1,15 @@
+import asyncio
+from typing import Awaitable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_bounded(coros: Iterable[Awaitable[T]], limit: int) -> List[T]:
+    """Like asyncio.gather, but with at most `limit` awaitables running at once"""
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def run(coro: Awaitable[T]) -> T:
+        async with semaphore:
+            return await coro
+    
+    return await asyncio.gather(*(run(coro) for coro in coros))
\ No newline at end of file
@@ -1,6 +1,23 @@
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from difflib import SequenceMatcher
+import numpy as np
+from cachetools import LRUCache
+
+# RapidFuzz's ratio is an edit-distance (Indel) score, not difflib's matching-blocks ratio: it is often
+# higher, so some near-miss headers now clear the fuzzy bar. difflib stays as the fallback when RapidFuzz
+# is not installed, and fuzzy mappings then follow difflib's scores instead
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = None
+    process = None
+
+# A ".*word.*" pattern only asks whether word appears before the first line break
+_CONTAINS_PATTERN = re.compile(r"\.\*([^.^$*+?{}\[\]\\|()]+)\.\*")
+
+# Header mappings remembered per (target schema, header); uploads keep sending the same headers
+MATCH_CACHE_SIZE = 4096
 
 
 class PatternMatcher:
@@ -134,74 +151,179 @@ class PatternMatcher:
                 "confidence": 0.8
             }
         }
+        
+        self._compile_field_matchers()
+        self._match_cache = LRUCache(maxsize=MATCH_CACHE_SIZE)
     
     def match_columns(
         self,
         headers: List[str],
         target_schema: Dict[str, str]
     ) -> Dict[str, Dict[str, Any]]:
+        # Target order breaks ties, so the key keeps it; callers get copies they are free to change
+        schema_key = tuple(target_schema.keys())
         mappings = {}
-        
         for header in headers:
-            best_match = self._find_best_match(header, target_schema)
-            mappings[header] = best_match
+            cached = self._match_cache.get((schema_key, header))
+            mappings[header] = dict(cached) if cached is not None else None
+        
+        pending = [header for header, best_match in mappings.items() if best_match is None]
+        if not pending:
+            return mappings
+        
+        # Lowercased target names for exact matches; the first of any that differ only in case wins
+        exact_targets = {}
+        for target_field in target_schema.keys():
+            exact_targets.setdefault(target_field.lower(), target_field)
+        
+        targets_by_type = self._targets_by_type(target_schema)
+        normalized = {header: header.lower().strip() for header in pending}
+        for header in pending:
+            mappings[header] = self._find_best_match(normalized[header], exact_targets, targets_by_type)
+        
+        # Finally, try fuzzy matching; every unplaced header is scored against every target in one batch
+        unresolved = [header for header in pending if mappings[header]["confidence"] < 0.7]
+        if unresolved and target_schema:
+            target_fields = list(target_schema.keys())
+            similarities = self._calculate_similarities(
+                [normalized[header] for header in unresolved],
+                [target_field.lower() for target_field in target_fields]
+            )
+            for header, row in zip(unresolved, similarities):
+                mappings[header] = self._fuzzy_match(mappings[header], target_fields, row)
+        
+        for header in pending:
+            self._match_cache[(schema_key, header)] = dict(mappings[header])
         
         return mappings
     
     def _find_best_match(
         self,
-        header: str,
-        target_schema: Dict[str, str]
+        header_lower: str,
+        exact_targets: Dict[str, str],
+        targets_by_type: Dict[str, List[str]]
+    ) -> Dict[str, Any]:
+        # First, try exact match
+        if header_lower in exact_targets:
+            return {
+                "target_field": exact_targets[header_lower],
+                "confidence": 1.0,
+                "reasoning": "Exact match"
+            }
+        
+        # Then, try pattern matching; the best candidate lives in locals until one dict is built at the end
+        best_confidence = 0.0
+        best_target = None
+        best_type = None
+        first_line = header_lower.partition("\n")[0]
+        for field_type, confidence, substrings, regex in self.field_matchers:
+            # Only a type that beats the current confidence and maps to some target can change the result
+            if confidence <= best_confidence:
+                continue
+            target_fields = targets_by_type.get(field_type)
+            if not target_fields:
+                continue
+            
+            matched = False
+            for substring in substrings:
+                if substring in first_line:
+                    matched = True
+                    break
+            if not matched and regex is not None:
+                matched = regex.match(header_lower) is not None
+            
+            if matched:
+                # The first target field of this type wins; the rest tie on confidence
+                best_confidence, best_target, best_type = confidence, target_fields[0], field_type
+                if best_confidence >= self.max_confidence:
+                    break
+        
+        if best_type is None:
+            return {
+                "target_field": None,
+                "confidence": 0.0,
+                "reasoning": "No pattern match found"
+            }
+        
+        return {
+            "target_field": best_target,
+            "confidence": best_confidence,
+            "reasoning": f"Pattern match for {best_type}"
+        }
+    
+    def _targets_by_type(self, target_schema: Dict[str, str]) -> Dict[str, List[str]]:
+        # Target fields each field type can map to, in schema order; built once per match_columns call
+        targets_by_type = {}
+        for field_type in self.patterns:
+            target_fields = [
+                target_field for target_field in target_schema.keys()
+                if field_type in target_field.lower() or target_field.lower() in field_type
+            ]
+            if target_fields:
+                targets_by_type[field_type] = target_fields
+        
+        return targets_by_type
+    
+    def _fuzzy_match(
+        self,
+        best_match: Dict[str, Any],
+        target_fields: List[str],
+        similarities: List[float]
     ) -> Dict[str, Any]:
-        header_lower = header.lower().strip()
-        best_match = {
-            "target_field": None,
-            "confidence": 0.0,
-            "reasoning": "No pattern match found"
+        confidence = best_match["confidence"]
+        best_target = None
+        best_similarity = None
+        for target_field, similarity in zip(target_fields, similarities):
+            if similarity > 0.7 and similarity > confidence:
+                best_target, best_similarity = target_field, similarity
+                confidence = similarity * 0.8  # Reduce confidence for fuzzy matches
+        
+        if best_similarity is None:
+            return best_match
+        
+        return {
+            "target_field": best_target,
+            "confidence": confidence,
+            "reasoning": f"Fuzzy match (similarity: {best_similarity:.2f})"
         }
+    
+    def _compile_field_matchers(self):
+        # Field type, confidence, substrings and one compiled alternation side by side, in pattern order;
+        # a header only needs to know whether any of a type's patterns match
+        self.field_matchers: Tuple[Tuple[str, float, Tuple[str, ...], Optional[re.Pattern]], ...] = tuple(
+            (field_type, pattern_info["confidence"], *self._compile_patterns(pattern_info["patterns"]))
+            for field_type, pattern_info in self.patterns.items()
+        )
+        # Once a header matches at this confidence no other field type can beat it
+        self.max_confidence = max((matcher[1] for matcher in self.field_matchers), default=0.0)
+    
+    def _compile_patterns(self, patterns: List[str]) -> Tuple[Tuple[str, ...], Optional[re.Pattern]]:
+        # ".*word.*" patterns become plain substring checks; the rest share one alternation,
+        # each alternative tried at the start of the header, the same as re.match on its own
+        substrings = []
+        regexes = []
+        for pattern in patterns:
+            contains = _CONTAINS_PATTERN.fullmatch(pattern)
+            if contains:
+                substrings.append(contains.group(1))
+            else:
+                regexes.append(pattern)
         
-        # First, try exact match
-        for target_field in target_schema.keys():
-            if header_lower == target_field.lower():
-                return {
-                    "target_field": target_field,
-                    "confidence": 1.0,
-                    "reasoning": "Exact match"
-                }
-        
-        # Then, try pattern matching
-        for field_type, pattern_info in self.patterns.items():
-            for pattern in pattern_info["patterns"]:
-                if re.match(pattern, header_lower):
-                    # Find target field that matches this type
-                    for target_field in target_schema.keys():
-                        if field_type in target_field.lower() or target_field.lower() in field_type:
-                            confidence = pattern_info["confidence"]
-                            
-                            if confidence > best_match["confidence"]:
-                                best_match = {
-                                    "target_field": target_field,
-                                    "confidence": confidence,
-                                    "reasoning": f"Pattern match for {field_type}"
-                                }
-        
-        # Finally, try fuzzy matching
-        if best_match["confidence"] < 0.7:
-            for target_field in target_schema.keys():
-                similarity = self._calculate_similarity(header_lower, target_field.lower())
-                
-                if similarity > 0.7 and similarity > best_match["confidence"]:
-                    best_match = {
-                        "target_field": target_field,
-                        "confidence": similarity * 0.8,  # Reduce confidence for fuzzy matches
-                        "reasoning": f"Fuzzy match (similarity: {similarity:.2f})"
-                    }
-        
-        return best_match
+        regex = re.compile("|".join(f"(?:{pattern})" for pattern in regexes)) if regexes else None
+        return tuple(substrings), regex
     
-    def _calculate_similarity(self, str1: str, str2: str) -> float:
+    def _calculate_similarities(self, headers: List[str], target_fields: List[str]) -> List[List[float]]:
+        # One row of 0-1 similarities per header, one column per target field; the two scorers can disagree
+        if process is not None:
+            # Anything under 70 can never pass the 0.7 bar, so RapidFuzz may give up on it early and report 0
+            scores = process.cdist(headers, target_fields, scorer=fuzz.ratio, dtype=np.float64, score_cutoff=70)
+            return (scores / 100.0).tolist()
+        
         # Use SequenceMatcher for fuzzy string matching
-        return SequenceMatcher(None, str1, str2).ratio()
+        return [
+            [SequenceMatcher(None, header, target_field).ratio() for target_field in target_fields]
+            for header in headers
+        ]
     
     def add_custom_pattern(
         self,
@@ -215,4 +337,8 @@ class PatternMatcher:
                 "confidence": confidence
             }
         else:
-            self.patterns[field_type]["patterns"].extend(patterns)
\ No newline at end of file
+            self.patterns[field_type]["patterns"].extend(patterns)
+        
+        self._compile_field_matchers()
+        # Earlier mappings were made without these patterns
+        self._match_cache.clear()
\ No newline at end of file
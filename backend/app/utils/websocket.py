@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import orjson
+from fastapi import WebSocket
+import structlog
+
+logger = structlog.get_logger()
+
+_CLOSE = object()
+
+
+class BatchedWSSender:
+    """Coalesce outbound WebSocket messages into JSON arrays sent as one frame"""
+    
+    def __init__(self, websocket: WebSocket, max_batch: int = 32, flush_interval: float = 0.025):
+        self.websocket = websocket
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Set once the pump stops, including when the peer has gone away
+        self.closed = asyncio.Event()
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    def send(self, message: Dict[str, Any]) -> bool:
+        # Nothing drains the queue once the pump has stopped, so later messages are dropped
+        if self.closed.is_set():
+            return False
+        
+        self._queue.put_nowait(message)
+        return True
+    
+    async def close(self):
+        if self._task is None:
+            return
+        
+        # Flush whatever is queued, then stop the pump
+        if not self.closed.is_set():
+            self._queue.put_nowait(_CLOSE)
+        try:
+            await self._task
+        finally:
+            self._task = None
+    
+    async def _run(self):
+        try:
+            await self._pump()
+        finally:
+            self.closed.set()
+            # Release whatever was queued after the last frame
+            while not self._queue.empty():
+                self._queue.get_nowait()
+    
+    async def _pump(self):
+        closing = False
+        while not closing:
+            first = await self._queue.get()
+            if first is _CLOSE:
+                return
+            
+            # Give closely spaced events a moment to pile up before sending
+            await asyncio.sleep(self.flush_interval)
+            
+            messages: List[Dict[str, Any]] = [first]
+            while len(messages) < self.max_batch and not self._queue.empty():
+                message = self._queue.get_nowait()
+                if message is _CLOSE:
+                    closing = True
+                    break
+                messages.append(message)
+            
+            try:
+                await self.websocket.send_bytes(orjson.dumps(messages))
+            except Exception as e:
+                logger.error("WebSocket send error", error=str(e))
+                return
@@ -4,11 +4,18 @@ Quick test script to verify Gemini API connection
 """
 import asyncio
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import google.generativeai as genai
 
 load_dotenv()
 
+@lru_cache(maxsize=1)
+def get_model(api_key: str) -> genai.GenerativeModel:
+    # Configure the SDK and build the model once, however many times the check runs
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
 async def test_gemini():
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -18,8 +25,7 @@ async def test_gemini():
     print(f"✅ API Key found: {api_key[:10]}...")
     
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_model(api_key)
         
         response = await model.generate_content_async(
             "Say 'Hello, CSV Parser!' if you're working correctly."